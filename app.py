@@ -1,29 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from starlette.middleware.gzip import GZipMiddleware, DEFAULT_EXCLUDED_CONTENT_TYPES
 from src.api.route_validator import router as route_validator_router
 from src.models.route_models import init_db
-from src.core.redis_client import RedisMicroservice
+from src.core.redis_client import AsyncRedisMicroservice, RedisStreamsMicroservice
+from src.core.job_manager import validation_jobs
+from src.core.exporters import FrameExporter
+from src.services.gescom_service import GescomService
 import os
 
-app = FastAPI(title="Sales Microservice")
+# Inicializar DB y Redis al arrancar; cerrar ordenadamente al apagar
+@asynccontextmanager
+async def lifespan(app):
+    init_db()
+    await redis_ms.start()
+    yield
+    await redis_ms.stop()
+    validation_jobs.shutdown()
+
+app = FastAPI(title="Sales Microservice", lifespan=lifespan)
+# Los JSON, NDJSON y CSV de historial/validación son grandes y muy repetitivos: se comprimen si el cliente
+# acepta gzip. Las exportaciones binarias (xlsx, parquet, arrow) se envían tal cual
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6,
+                   exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + FrameExporter.BINARY_MEDIA_TYPES)
 
 # Configuración Redis
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+# pubsub (default, transporte estándar de NestJS) o streams (consumer group: cada mensaje lo procesa una sola réplica)
+REDIS_TRANSPORT = os.getenv("REDIS_TRANSPORT", "pubsub")
+RedisTransport = RedisStreamsMicroservice if REDIS_TRANSPORT == "streams" else AsyncRedisMicroservice
 # El queue name debe coincidir con lo que NestJS envía
-redis_ms = RedisMicroservice(host=REDIS_HOST, port=REDIS_PORT, queue="SALES_SERVICE")
+redis_ms = RedisTransport(host=REDIS_HOST, port=REDIS_PORT, queue="SALES_SERVICE")
 
 # Handler para datos de Gescom vía Redis
 @redis_ms.on("process_gescom_data")
 def handle_gescom_data(data):
-    print(f"[*] Recibidos datos de Gescom vía Redis: {data}")
-    # Aquí procesarías los datos recibidos
-    return {"status": "processed", "received": len(data) if isinstance(data, list) else 1}
-
-# Inicializar DB al arrancar
-@app.on_event("startup")
-def startup_event():
-    init_db()
-    redis_ms.start()
+    # Validación, normalización e inserción por chunks (GESCOM_CHUNK_ROWS); el progreso se loguea por chunk
+    return GescomService.ingest(data)
 
 # Rutas de Salud
 @app.get("/health")
@@ -0,0 +1 @@
+# Raíz del repo: pytest la agrega a sys.path para que los tests importen `src`
@@ -1,27 +1,55 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
-import io
+from datetime import datetime
 
 from src.services.recorrido_service import RecorridoService
 from src.services.frecuencia_service import FrecuenciaService
-from src.services.validator_service import ValidatorService
+from src.services.validation_service import ValidationService, RecorridoVacioError
+from src.core.job_manager import validation_jobs, JobQueueFullError
+from src.core.exporters import FrameExporter
+from src.core.pagination import InvalidCursorError
+from src.core.http_cache import ConditionalGet
 
 router = APIRouter(prefix="/route-validator", tags=["Route Validator"])
 
 @router.get("/history")
-async def get_history():
+async def get_history(response: Response, limit: int = None, cursor: str = None, desde: str = None,
+                      hasta: str = None):
+    """
+    Lista de batches, del más reciente al más antiguo.
+    - limit / cursor: paginación; si hay más páginas el cursor siguiente viene en el header X-Next-Cursor
+    - desde / hasta (YYYY-MM-DD): batches cuyo período se cruza con el rango
+    """
+    try:
+        desde = datetime.strptime(desde, "%Y-%m-%d") if desde else None
+        hasta = datetime.strptime(hasta, "%Y-%m-%d") if hasta else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas inválidas: usar YYYY-MM-DD.")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit debe ser mayor a 0.")
     try:
-        return FrecuenciaService.get_history()
+        items, next_cursor = FrecuenciaService.get_history(limit, cursor, desde, hasta)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return items
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history/{batch_id}")
-async def get_batch_details(batch_id: str):
+async def get_batch_details(batch_id: str, request: Request, response: Response):
     try:
+        # Un batch guardado no cambia: con If-None-Match vigente alcanza con confirmar que existe
+        etag = ConditionalGet.etag("history", batch_id)
+        if ConditionalGet.matches(request, etag) and FrecuenciaService.get_axum_gps_id(batch_id) is not None:
+            return ConditionalGet.not_modified(etag)
         result = FrecuenciaService.get_batch_details(batch_id)
         if not result:
             raise HTTPException(status_code=404, detail="Batch no encontrado")
+        response.headers.update(ConditionalGet.headers(etag))
         return result
     except HTTPException:
         raise
@@ -29,23 +57,59 @@ async def get_batch_details(batch_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history/{batch_id}/hours")
-async def get_batch_hours(batch_id: str):
+async def get_batch_hours(batch_id: str, request: Request, response: Response):
     try:
+        etag = ConditionalGet.etag("hours", batch_id)
+        if ConditionalGet.matches(request, etag) and FrecuenciaService.get_axum_gps_id(batch_id) is not None:
+            return ConditionalGet.not_modified(etag)
         result = FrecuenciaService.get_batch_hours(batch_id)
         if not result:
             raise HTTPException(status_code=404, detail="Batch no encontrado")
+        response.headers.update(ConditionalGet.headers(etag))
         return result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/history/{batch_id}/export")
+async def export_batch(batch_id: str, format: str = "ndjson", tabla: str = "visitas"):
+    """
+    Exporta un batch guardado leyendo la base por bloques mientras se envía la respuesta.
+    - format: ndjson | csv (una tabla, elegida con 'tabla') | xlsx (visitas, horas_resumen y horas_detalle)
+    - tabla: visitas | horas_resumen | horas_detalle
+    """
+    if format not in ("ndjson", "csv", "xlsx"):
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {format}. Opciones: ndjson, csv, xlsx")
+    if tabla not in FrecuenciaService.EXPORT_TABLAS:
+        raise HTTPException(status_code=400, detail=f"Tabla inválida: {tabla}. Opciones: {', '.join(FrecuenciaService.EXPORT_TABLAS)}")
+    try:
+        axum_gps_id = await run_in_threadpool(FrecuenciaService.get_axum_gps_id, batch_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if axum_gps_id is None:
+        raise HTTPException(status_code=404, detail="Batch no encontrado")
+
+    if format == "xlsx":
+        sheets = [("Visitas", FrecuenciaService.iter_batch_table(axum_gps_id, "visitas")),
+                  ("Horas_Resumen", FrecuenciaService.iter_batch_table(axum_gps_id, "horas_resumen")),
+                  ("Horas_Detalle", FrecuenciaService.iter_batch_table(axum_gps_id, "horas_detalle"))]
+        return StreamingResponse(FrameExporter.iter_xlsx(sheets), media_type=FrameExporter.XLSX_MEDIA_TYPE,
+                                 headers={"Content-Disposition": f"attachment; filename={batch_id}.xlsx"})
+    chunks = FrecuenciaService.iter_batch_table(axum_gps_id, tabla)
+    if format == "csv":
+        return StreamingResponse(FrameExporter.iter_csv(chunks), media_type=FrameExporter.CSV_MEDIA_TYPE,
+                                 headers={"Content-Disposition": f"attachment; filename={batch_id}_{tabla}.csv"})
+    return StreamingResponse(FrameExporter.iter_ndjson_chunks(chunks), media_type=FrameExporter.MEDIA_TYPES["ndjson"])
+
 @router.get("/frecuencia/recent")
 async def get_recent_frecuencia(
     limit: int = 50, 
     vendedor: str = None, 
     cliente: str = None,
-    batch_id: str = None
+    batch_id: str = None,
+    cursor: str = None,
+    count: str = "none"
 ):
     """
     Obtiene las últimas N visitas de frecuencia con filtros opcionales.
@@ -53,22 +117,37 @@ async def get_recent_frecuencia(
     - vendedor: Filtro por vendedor (búsqueda parcial)
     - cliente: Filtro por cliente (búsqueda parcial)
     - batch_id: Filtro por batch específico
+    - cursor: next_cursor de la respuesta anterior para pedir la página siguiente
+    - count: exact | estimated | none. Total de filas filtradas en 'total_filtrado' (default: none)
     """
     try:
-        return FrecuenciaService.get_recent_frecuencia(limit, vendedor, cliente, batch_id)
+        return FrecuenciaService.get_recent_frecuencia(limit, vendedor, cliente, batch_id, cursor, count)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/frecuencia/summary")
 async def get_frecuencia_summary(
+    request: Request,
+    response: Response,
     vendedor: str = None,
     batch_id: str = None
 ):
     """
     Obtiene el resumen de tiempos totales por vendedor.
+    Con batch_id de un batch existente la respuesta lleva ETag (sin batch_id depende del último procesado).
     """
     try:
-        return FrecuenciaService.get_frecuencia_summary(vendedor, batch_id)
+        etag = None
+        if batch_id and FrecuenciaService.get_axum_gps_id(batch_id) is not None:
+            etag = ConditionalGet.etag("summary", batch_id, vendedor or "")
+            if ConditionalGet.matches(request, etag):
+                return ConditionalGet.not_modified(etag)
+        result = FrecuenciaService.get_frecuencia_summary(vendedor, batch_id)
+        if etag:
+            response.headers.update(ConditionalGet.headers(etag))
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -86,14 +165,19 @@ async def upload_recorrido(file: UploadFile = File(...)):
 @router.get("/recorrido")
 async def list_recorridos(limit: int = 100, offset: int = 0, search_vendedor: str = None, 
                           search_cliente: str = None, linea: str = None, bloque: str = None,
-                          semana: int = None, dia: str = None):
+                          semana: int = None, dia: str = None, cursor: str = None, count: str = "exact"):
+    """
+    cursor: next_cursor de la respuesta anterior (reemplaza a offset). count: exact | estimated | none.
+    """
     try:
-        items, total = RecorridoService.get_all_recorridos(
-            limit=limit, offset=offset, vendedor=search_vendedor, 
+        items, total, next_cursor = RecorridoService.get_all_recorridos(
+            limit=limit, offset=offset, cursor=cursor, count=count, vendedor=search_vendedor, 
             cliente=search_cliente, linea=linea, bloque=bloque, 
             semana=semana, dia=dia
         )
-        return {"items": items, "total": total}
+        return {"items": items, "total": total, "next_cursor": next_cursor}
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -124,48 +208,145 @@ async def remove_recorrido(id: int):
         return {"message": "Recorrido eliminado correctamente"}
     except Exception as e: raise HTTPException(status_code=500, detail=str(e))
 
+def build_validation_response(df_res, df_horas_resumen, df_horas_detalle, fecha_inicio, fecha_fin, format,
+                              tabla="visitas"):
+    if df_res.empty:
+        return JSONResponse(status_code=404, content={"message": "No se encontraron coincidencias."})
+
+    if format in FrameExporter.MEDIA_TYPES:
+        # Formatos por tabla: 'tabla' elige visitas, horas_resumen u horas_detalle
+        frames = {"visitas": df_res, "horas_resumen": df_horas_resumen, "horas_detalle": df_horas_detalle}
+        if tabla not in frames:
+            raise HTTPException(status_code=400, detail=f"Tabla inválida: {tabla}. Opciones: {', '.join(frames)}")
+        df = frames[tabla]
+        media_type = FrameExporter.MEDIA_TYPES[format]
+        if format == "ndjson":
+            return StreamingResponse(FrameExporter.iter_ndjson(df), media_type=media_type)
+        content = FrameExporter.to_parquet(df) if format == "parquet" else FrameExporter.to_arrow(df)
+        return Response(content=content, media_type=media_type,
+                        headers={"Content-Disposition": f"attachment; filename={tabla}.{format}"})
+    
+    if format == "excel":
+        # Las hojas se escriben y comprimen fila a fila mientras se envían: el libro nunca está entero en memoria
+        sheets = [("Visitas", df_res), ("Horas_Resumen", df_horas_resumen), ("Horas_Detalle", df_horas_detalle)]
+        return StreamingResponse(FrameExporter.iter_xlsx(sheets), media_type=FrameExporter.XLSX_MEDIA_TYPE,
+                                 headers={"Content-Disposition": "attachment; filename=Reporte.xlsx"})
+    
+    df_res_json = df_res.copy()
+    for col in ['Fecha_Checkin', 'Fecha_Checkout']:
+        if col in df_res_json.columns:
+            df_res_json[col] = pd.to_datetime(df_res_json[col], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+    
+    return {
+        "metadata": {"fecha_desde": fecha_inicio, "fecha_hasta": fecha_fin},
+        "visitas": df_res_json.to_dict(orient="records"),
+        "horas_resumen": df_horas_resumen.to_dict(orient="records"),
+        "horas_detalle": df_horas_detalle.to_dict(orient="records"),
+        "resumen": {"total_visitas": len(df_res), "total_vendedores": len(df_horas_resumen)}
+    }
+
 @router.post("/validate")
 async def validate_routes(recorrido: UploadFile = File(None), horario: UploadFile = File(...),
                           fecha_inicio: str = Form("01/10/2025"), fecha_fin: str = Form("30/11/2025"),
-                          semana_inicio: int = Form(1), format: str = Form("json")):
+                          semana_inicio: int = Form(1), format: str = Form("json"), tabla: str = Form("visitas")):
+    """
+    format: json | excel | parquet | arrow | ndjson. Para parquet, arrow y ndjson se devuelve
+    una sola tabla elegida con 'tabla' (visitas, horas_resumen, horas_detalle).
+    """
     try:
         horario_content = await horario.read()
-        if recorrido:
-            recorrido_content = await recorrido.read()
-            df_prog = ValidatorService.procesar_recorrido(recorrido_content)
-        else:
-            df_prog = RecorridoService.get_recorrido_from_db()
-            if df_prog.empty: raise HTTPException(status_code=400, detail="No hay datos de recorrido.")
-
-        df_res, df_horas_resumen, df_horas_detalle, df_prog_full = ValidatorService.procesar_con_df_prog(
-            df_prog, horario_content, fecha_inicio, fecha_fin, semana_inicio=semana_inicio
+        recorrido_content = await recorrido.read() if recorrido else None
+        # El procesamiento es CPU-bound: lo sacamos del event loop para no frenar /health y el resto de rutas
+        df_res, df_horas_resumen, df_horas_detalle = await run_in_threadpool(
+            ValidationService.run, horario_content, recorrido_content, fecha_inicio, fecha_fin, semana_inicio=semana_inicio
         )
+        return await run_in_threadpool(build_validation_response, df_res, df_horas_resumen, df_horas_detalle,
+                                       fecha_inicio, fecha_fin, format, tabla)
+    except HTTPException:
+        raise
+    except RecorridoVacioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback; print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/validate/jobs", status_code=202)
+async def submit_validation_job(recorrido: UploadFile = File(None), horario: UploadFile = File(...),
+                                fecha_inicio: str = Form("01/10/2025"), fecha_fin: str = Form("30/11/2025"),
+                                semana_inicio: int = Form(1)):
+    """
+    Encola una validación en el pool de procesos y devuelve su job_id.
+    Consultar el estado en /validate/jobs/{job_id} y el resultado en /validate/jobs/{job_id}/result.
+    """
+    horario_content = await horario.read()
+    recorrido_content = await recorrido.read() if recorrido else None
+    try:
+        job_id = validation_jobs.submit(
+            ValidationService.run, horario_content, recorrido_content, fecha_inicio, fecha_fin, semana_inicio,
+            meta={"fecha_desde": fecha_inicio, "fecha_hasta": fecha_fin, "semana_inicio": semana_inicio}
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status": "pending"}
 
+@router.get("/validate/jobs/{job_id}")
+async def get_validation_job(job_id: str):
+    status = validation_jobs.status(job_id)
+    if not status: raise HTTPException(status_code=404, detail="Job no encontrado")
+    return status
+
+@router.get("/validate/jobs/{job_id}/result")
+async def get_validation_job_result(job_id: str, format: str = "json", tabla: str = "visitas"):
+    status = validation_jobs.status(job_id)
+    if not status: raise HTTPException(status_code=404, detail="Job no encontrado")
+    if status["status"] in ("pending", "running"):
+        return JSONResponse(status_code=409, content=status)
+    if status["status"] != "done":
+        job = validation_jobs.get(job_id)
+        vacio = job and job["future"].done() and isinstance(job["future"].exception(), RecorridoVacioError)
+        code = 400 if vacio else 500
+        raise HTTPException(status_code=code, detail=status.get("error", status["status"]))
+    try:
+        job = validation_jobs.get(job_id)
+        if job is None: raise HTTPException(status_code=404, detail="Job no encontrado")
+        df_res, df_horas_resumen, df_horas_detalle = job["future"].result()
+        meta = status["meta"]
+        # Pasar el resultado a dict/parquet es CPU-bound: fuera del event loop, igual que en /validate
+        return await run_in_threadpool(build_validation_response, df_res, df_horas_resumen, df_horas_detalle,
+                                       meta["fecha_desde"], meta["fecha_hasta"], format, tabla)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/validate-and-save")
+async def validate_and_save(recorrido: UploadFile = File(None), horario: UploadFile = File(...),
+                            fecha_inicio: str = Form("01/10/2025"), fecha_fin: str = Form("30/11/2025"),
+                            semana_inicio: int = Form(1)):
+    """Valida y guarda el batch en el servidor; solo devuelve el batch_id y los totales."""
+    try:
+        horario_content = await horario.read()
+        recorrido_content = await recorrido.read() if recorrido else None
+        df_res, df_horas_resumen, df_horas_detalle = await run_in_threadpool(
+            ValidationService.run, horario_content, recorrido_content, fecha_inicio, fecha_fin, semana_inicio=semana_inicio
+        )
         if df_res.empty:
             return JSONResponse(status_code=404, content={"message": "No se encontraron coincidencias."})
-        
-        if format == "excel":
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_res.to_excel(writer, sheet_name='Visitas', index=False)
-                df_horas_resumen.to_excel(writer, sheet_name='Horas_Resumen', index=False)
-                df_horas_detalle.to_excel(writer, sheet_name='Horas_Detalle', index=False)
-            output.seek(0)
-            return StreamingResponse(output, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                     headers={"Content-Disposition": "attachment; filename=Reporte.xlsx"})
-        
-        df_res_json = df_res.copy()
-        for col in ['Fecha_Checkin', 'Fecha_Checkout']:
-            if col in df_res_json.columns:
-                df_res_json[col] = pd.to_datetime(df_res_json[col], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
-        
+        metadata = {"fecha_desde": fecha_inicio, "fecha_hasta": fecha_fin, "semana_inicio": semana_inicio}
+        batch_id = await run_in_threadpool(
+            FrecuenciaService.process_and_save_frames, df_res, df_horas_resumen, df_horas_detalle, metadata
+        )
         return {
-            "metadata": {"fecha_desde": fecha_inicio, "fecha_hasta": fecha_fin},
-            "visitas": df_res_json.to_dict(orient="records"),
-            "horas_resumen": df_horas_resumen.to_dict(orient="records"),
-            "horas_detalle": df_horas_detalle.to_dict(orient="records"),
-            "resumen": {"total_visitas": len(df_res), "total_vendedores": len(df_horas_resumen)}
+            "message": "Procesamiento guardado exitosamente.",
+            "batch_id": batch_id,
+            "resumen": {
+                "total_visitas": len(df_res),
+                "total_vendedores": len(df_horas_resumen),
+                "total_horas_detalle": len(df_horas_detalle)
+            }
         }
+    except RecorridoVacioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback; print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
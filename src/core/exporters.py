@@ -0,0 +1,230 @@
+import io
+import zipfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+XLSX_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_FOOTER = '</sheetData></worksheet>'
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+class StreamSink:
+    """Destino de escritura no 'seekable' para zipfile: acumula bytes hasta que se drenan."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+class FrameExporter:
+    """Serializa DataFrames a formatos columnares o por líneas sin armar un dict por registro."""
+    NDJSON_CHUNK_ROWS = 5000
+    MEDIA_TYPES = {
+        "parquet": "application/vnd.apache.parquet",
+        "arrow": "application/vnd.apache.arrow.stream",
+        "ndjson": "application/x-ndjson",
+    }
+    CSV_MEDIA_TYPE = "text/csv"
+    XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # Exportaciones binarias que el middleware gzip deja pasar sin comprimir (xlsx y parquet ya vienen comprimidos)
+    BINARY_MEDIA_TYPES = (MEDIA_TYPES["parquet"], MEDIA_TYPES["arrow"], XLSX_MEDIA_TYPE)
+
+    @staticmethod
+    def to_arrow_table(df: pd.DataFrame):
+        # Columnas object con tipos mezclados (ej. 'Tiempo_PDV_Original') se exportan como texto
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    @staticmethod
+    def to_parquet(df: pd.DataFrame):
+        buffer = io.BytesIO()
+        pq.write_table(FrameExporter.to_arrow_table(df), buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def to_arrow(df: pd.DataFrame):
+        table = FrameExporter.to_arrow_table(df)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def ndjson_lines(chunk: pd.DataFrame):
+        if chunk.empty:
+            return ""
+        chunk = chunk.copy()
+        for col in chunk.columns:
+            if pd.api.types.is_datetime64_any_dtype(chunk[col]):
+                chunk[col] = chunk[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+        lines = chunk.to_json(orient="records", lines=True, force_ascii=False, date_format="iso")
+        return lines if lines.endswith("\n") else lines + "\n"
+
+    @staticmethod
+    def iter_ndjson(df: pd.DataFrame, chunk_rows: int = None):
+        """Genera el DataFrame como NDJSON en bloques de `chunk_rows` filas."""
+        chunk_rows = chunk_rows or FrameExporter.NDJSON_CHUNK_ROWS
+        for start in range(0, len(df), chunk_rows):
+            yield FrameExporter.ndjson_lines(df.iloc[start:start + chunk_rows])
+
+    @staticmethod
+    def iter_ndjson_chunks(chunks):
+        """Igual que iter_ndjson pero a partir de un iterable de DataFrames (ej. lecturas por bloques de la base)."""
+        for chunk in chunks:
+            lines = FrameExporter.ndjson_lines(chunk)
+            if lines:
+                yield lines
+
+    @staticmethod
+    def iter_csv(chunks):
+        """CSV a partir de un iterable de DataFrames; el encabezado sale con el primer bloque."""
+        header = True
+        for chunk in chunks:
+            yield chunk.to_csv(index=False, header=header, date_format='%Y-%m-%d %H:%M:%S')
+            header = False
+
+    @staticmethod
+    def xlsx_escape(values: pd.Series):
+        return (values.str.replace('&', '&amp;', regex=False).str.replace('<', '&lt;', regex=False)
+                .str.replace('>', '&gt;', regex=False)
+                .str.replace(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', regex=True))
+
+    @staticmethod
+    def xlsx_cells(values: pd.Series):
+        """XML de las celdas de una columna, convertido según el dtype de la columna."""
+        vacio = values.isna()
+        if pd.api.types.is_bool_dtype(values):
+            xml = '<c t="b"><v>' + values.astype(int).astype(str) + '</v></c>'
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            serial = (values - EXCEL_EPOCH) / pd.Timedelta(days=1)
+            xml = '<c s="1"><v>' + serial.map(repr) + '</v></c>'
+        elif pd.api.types.is_numeric_dtype(values):
+            vacio = vacio | ~pd.Series(pd.to_numeric(values, errors='coerce'), index=values.index).abs().lt(float('inf'))
+            xml = '<c><v>' + values.astype(object).map(repr) + '</v></c>'
+        else:
+            texto = FrameExporter.xlsx_escape(values.astype(object).where(vacio, values.astype(str)).fillna(''))
+            xml = '<c t="inlineStr"><is><t xml:space="preserve">' + texto + '</t></is></c>'
+        return xml.where(~vacio, '<c/>')
+
+    @staticmethod
+    def xlsx_rows(df: pd.DataFrame, first_row: int):
+        if df.empty:
+            return ''
+        row_xml = None
+        for col in df.columns:
+            cells = FrameExporter.xlsx_cells(df[col].reset_index(drop=True))
+            row_xml = cells if row_xml is None else row_xml + cells
+        numeros = pd.Series(range(first_row, first_row + len(df))).astype(str)
+        return ('<row r="' + numeros + '">' + row_xml + '</row>').str.cat()
+
+    @staticmethod
+    def iter_xlsx(sheets, chunk_rows: int = None):
+        """Genera un .xlsx en bloques de bytes a medida que se escriben las filas.
+
+        `sheets` es una lista de (nombre, datos) donde datos es un DataFrame o un iterable de
+        DataFrames (bloques). Cada hoja va comprimida directo al zip, sin armar el libro en memoria.
+        """
+        chunk_rows = chunk_rows or FrameExporter.NDJSON_CHUNK_ROWS
+        sink = StreamSink()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            sheet_overrides = "".join(
+                f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for i in range(1, len(sheets) + 1)
+            )
+            zf.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES.format(sheets=sheet_overrides))
+            zf.writestr('_rels/.rels', XLSX_ROOT_RELS)
+            zf.writestr('xl/styles.xml', XLSX_STYLES)
+            nombres = "".join(
+                f'<sheet name="{FrameExporter.xlsx_escape(pd.Series([name[:31]]))[0]}" sheetId="{i}" r:id="rId{i}"/>'
+                for i, (name, _) in enumerate(sheets, 1)
+            )
+            zf.writestr('xl/workbook.xml', (
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                f'<sheets>{nombres}</sheets></workbook>'
+            ))
+            rels = "".join(
+                f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+                for i in range(1, len(sheets) + 1)
+            )
+            zf.writestr('xl/_rels/workbook.xml.rels', (
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                f'{rels}<Relationship Id="rId{len(sheets) + 1}" Target="styles.xml" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+                '</Relationships>'
+            ))
+            yield sink.drain()
+
+            for i, (name, data) in enumerate(sheets, 1):
+                chunks = [data] if isinstance(data, pd.DataFrame) else data
+                with zf.open(f'xl/worksheets/sheet{i}.xml', 'w', force_zip64=True) as f:
+                    f.write(XLSX_SHEET_HEADER.encode())
+                    fila = 1
+                    for chunk in chunks:
+                        for start in range(0, max(len(chunk), 1), chunk_rows):
+                            if fila == 1:
+                                encabezado = FrameExporter.xlsx_escape(pd.Series([str(c) for c in chunk.columns], dtype=object))
+                                f.write(('<row r="1">' + ''.join(
+                                    f'<c t="inlineStr" s="2"><is><t>{c}</t></is></c>' for c in encabezado
+                                ) + '</row>').encode())
+                                fila = 2
+                            bloque = chunk.iloc[start:start + chunk_rows]
+                            f.write(FrameExporter.xlsx_rows(bloque, fila).encode())
+                            fila += len(bloque)
+                            yield sink.drain()
+                    f.write(XLSX_SHEET_FOOTER.encode())
+                yield sink.drain()
+        yield sink.drain()
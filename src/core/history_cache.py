@@ -0,0 +1,33 @@
+import os
+import threading
+import time
+
+class HistoryCache:
+    """Cache en proceso de la primera página de /history (sin cursor ni filtro de fechas), una entrada por limit.
+
+    save_batch la invalida al confirmar un batch nuevo; el TTL acota lo que puede quedar desactualizado
+    si el batch se guardó desde otro proceso.
+    """
+    lock = threading.Lock()
+    entries = {}
+    ttl = int(os.getenv("HISTORY_CACHE_TTL", 30))
+    max_entries = 8
+
+    @classmethod
+    def get(cls, key, loader):
+        ahora = time.monotonic()
+        with cls.lock:
+            entry = cls.entries.get(key)
+            if entry is not None and entry[0] > ahora:
+                return entry[1]
+        data = loader()
+        with cls.lock:
+            if key not in cls.entries and len(cls.entries) >= cls.max_entries:
+                cls.entries.pop(next(iter(cls.entries)))
+            cls.entries[key] = (ahora + cls.ttl, data)
+        return data
+
+    @classmethod
+    def invalidate(cls):
+        with cls.lock:
+            cls.entries = {}
@@ -0,0 +1,34 @@
+import hashlib
+from fastapi import Request, Response
+
+class ConditionalGet:
+    """ETags para respuestas que dependen solo de un batch guardado (los batches no se modifican).
+
+    SCHEMA_VERSION entra en el hash: subirlo cuando cambie la forma de alguna de estas respuestas.
+    """
+    SCHEMA_VERSION = "1"
+    CACHE_CONTROL = "private, no-cache"  # El cliente guarda la respuesta pero revalida siempre con If-None-Match
+
+    @staticmethod
+    def etag(*parts):
+        raw = "\x1f".join([ConditionalGet.SCHEMA_VERSION, *(str(p) for p in parts)])
+        return f'"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+    @staticmethod
+    def matches(request: Request, etag: str):
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        # If-None-Match compara en forma débil: se ignora el prefijo W/
+        candidatos = {c.strip().removeprefix("W/") for c in header.split(",")}
+        return etag in candidatos
+
+    @staticmethod
+    def headers(etag: str):
+        return {"ETag": etag, "Cache-Control": ConditionalGet.CACHE_CONTROL}
+
+    @staticmethod
+    def not_modified(etag: str):
+        return Response(status_code=304, headers=ConditionalGet.headers(etag))
@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class JobQueueFullError(Exception):
+    pass
+
+class JobManager:
+    """Ejecuta trabajos pesados en un pool de procesos y guarda su estado para consultarlo por id.
+
+    `max_jobs` limita cuántos trabajos pueden estar pendientes o corriendo a la vez: cada uno retiene
+    el archivo subido en memoria hasta terminar. Los trabajos terminados (con sus DataFrames de resultado)
+    se conservan `ttl` segundos y como mucho `max_results` a la vez: al pasarse se descartan los más viejos.
+    Los ids solo son válidos en el proceso (worker de uvicorn) que los creó.
+
+    Si un worker muere (ej. OOM con un archivo grande) el pool queda roto: el siguiente submit lo reemplaza
+    por uno nuevo y los trabajos que quedaban en el pool roto pasan a error.
+    """
+    def __init__(self, max_workers=2, max_jobs=4, ttl=3600, max_results=8):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.max_results = max_results
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            # 'spawn' evita heredar conexiones de la base y el hilo de Redis del proceso padre
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def submit(self, fn, *args, meta=None, **kwargs):
+        with self.lock:
+            self.purge_expired()
+            activos = sum(1 for job in self.jobs.values() if not job["future"].done())
+            if activos >= self.max_jobs:
+                raise JobQueueFullError(f"Hay {activos} trabajos en curso; intente más tarde.")
+            job_id = uuid.uuid4().hex
+            try:
+                future = self.get_executor().submit(fn, *args, **kwargs)
+            except BrokenProcessPool:
+                self.reset_executor()
+                future = self.get_executor().submit(fn, *args, **kwargs)
+            self.jobs[job_id] = {"future": future, "created": time.time(), "finished": None, "meta": meta or {}}
+        future.add_done_callback(lambda f, job_id=job_id: self.mark_finished(job_id))
+        return job_id
+
+    def reset_executor(self):
+        """Descarta el pool roto; sus trabajos sin terminar quedan en error. Se llama con el lock tomado."""
+        print("[!] Pool de validación roto: se crea uno nuevo")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        ahora = time.time()
+        for job in self.jobs.values():
+            if not job["future"].done():
+                job["error"] = "El proceso de validación terminó inesperadamente."
+                job["finished"] = ahora
+
+    def mark_finished(self, job_id):
+        with self.lock:
+            if job_id in self.jobs and not self.jobs[job_id]["finished"]:
+                self.jobs[job_id]["finished"] = time.time()
+            self.purge_expired()
+
+    def purge_expired(self):
+        limite = time.time() - self.ttl
+        terminados = sorted((job["finished"], j) for j, job in self.jobs.items() if job["finished"])
+        vencidos = [j for finished, j in terminados if finished < limite]
+        vigentes = [j for finished, j in terminados if finished >= limite]
+        # Los resultados son DataFrames completos: además del TTL se acota cuántos quedan en memoria
+        excedentes = vigentes[:max(0, len(vigentes) - self.max_results)]
+        for job_id in vencidos + excedentes:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        future = job["future"]
+        if job.get("error"):
+            estado = "error"
+        elif not future.done():
+            estado = "running" if future.running() else "pending"
+        elif future.cancelled():
+            estado = "cancelled"
+        elif future.exception() is not None:
+            estado = "error"
+        else:
+            estado = "done"
+        result = {"job_id": job_id, "status": estado, "meta": job["meta"]}
+        if estado == "error":
+            result["error"] = job.get("error") or str(future.exception())
+        return result
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+validation_jobs = JobManager(
+    max_workers=int(os.getenv("VALIDATE_JOB_WORKERS", 2)),
+    max_jobs=int(os.getenv("VALIDATE_MAX_JOBS", 4)),
+    ttl=int(os.getenv("VALIDATE_JOB_TTL", 3600)),
+    max_results=int(os.getenv("VALIDATE_MAX_RESULTS", 8))
+)
@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import text
+
+class InvalidCursorError(ValueError):
+    pass
+
+class KeysetCursor:
+    """Cursor opaco para paginar por clave (keyset): guarda los valores de orden de la última fila entregada."""
+    COUNT_MODES = ("exact", "estimated", "none")
+
+    @staticmethod
+    def encode(*values):
+        payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str, size: int):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except Exception:
+            raise InvalidCursorError("Cursor inválido.")
+        if not isinstance(values, list) or len(values) != size:
+            raise InvalidCursorError("Cursor inválido.")
+        return values
+
+    @staticmethod
+    def decode_id(value):
+        """Id de un cursor decodificado; el payload es del cliente, así que se valida el tipo."""
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise InvalidCursorError("Cursor inválido.")
+        return value
+
+    @staticmethod
+    def decode_datetime(value):
+        if not isinstance(value, str):
+            raise InvalidCursorError("Cursor inválido.")
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise InvalidCursorError("Cursor inválido.")
+
+    @staticmethod
+    def count(db, query, table_name: str, mode: str = "exact", filtered: bool = True):
+        """Total de filas según `mode`: exact (COUNT), estimated (estadísticas de Postgres si no hay filtros) o none."""
+        if mode not in KeysetCursor.COUNT_MODES:
+            raise InvalidCursorError(f"count inválido: {mode}. Opciones: {', '.join(KeysetCursor.COUNT_MODES)}")
+        if mode == "none":
+            return None
+        if mode == "estimated" and not filtered and db.bind.dialect.name == "postgresql":
+            estimado = db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:tabla)"), {"tabla": table_name}
+            ).scalar()
+            # reltuples es -1 si la tabla nunca fue analizada
+            if estimado is not None and estimado >= 0:
+                return estimado
+        return query.order_by(None).count()
@@ -0,0 +1,26 @@
+import threading
+
+class RecorridoCache:
+    """Cache en proceso del recorrido programado (df_prog) y sus mapas derivados.
+
+    Cada entrada queda asociada a la versión de ruta guardada en `recorrido_version`;
+    si la versión de la base cambia, la próxima lectura recarga los datos.
+    """
+    lock = threading.Lock()
+    version = None
+    data = None
+
+    @classmethod
+    def get(cls, version, loader):
+        with cls.lock:
+            if cls.data is not None and cls.version == version:
+                return cls.data
+        data = loader()
+        with cls.lock:
+            cls.version, cls.data = version, data
+        return data
+
+    @classmethod
+    def invalidate(cls):
+        with cls.lock:
+            cls.version, cls.data = None, None
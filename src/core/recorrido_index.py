@@ -0,0 +1,111 @@
+import threading
+import numpy as np
+from src.core.recorrido_cache import RecorridoCache
+from src.core.pagination import KeysetCursor, InvalidCursorError
+
+class RecorridoIndexCache(RecorridoCache):
+    """Mismo esquema que RecorridoCache (una entrada por versión de ruta) pero para el índice de búsqueda."""
+    lock = threading.Lock()
+    version = None
+    data = None
+
+class RecorridoSearchIndex:
+    """Índice en memoria para los filtros del listado de recorridos.
+
+    Los campos de texto se buscan como subcadena literal sin distinguir mayúsculas ('%' y '_' no son comodines,
+    igual que el icontains con autoescape de RecorridoRepository.get_filtered):
+    cada valor distinto se indexa por sus trigramas, y la búsqueda intersecta los trigramas del texto buscado
+    para quedarse con pocos candidatos que después se verifican. semana y día son facetas exactas.
+    Las filas se guardan ordenadas por id DESC, así que las posiciones ordenadas ya respetan el orden del listado.
+    """
+    TEXT_FIELDS = ('vendedor', 'cliente', 'linea_origen', 'bloque')
+    NGRAM = 3
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.ids = np.array([r['id'] for r in rows], dtype=np.int64)
+        self.values = {}    # campo -> {valor en minúsculas: posiciones}
+        self.ngrams = {}    # campo -> {trigrama: set de valores}
+        for field in self.TEXT_FIELDS:
+            self.values[field] = self.group_positions(
+                (r[field].lower() if r[field] is not None else None) for r in rows
+            )
+            ngrams = {}
+            for value in self.values[field]:
+                for i in range(len(value) - self.NGRAM + 1):
+                    ngrams.setdefault(value[i:i + self.NGRAM], set()).add(value)
+            self.ngrams[field] = ngrams
+        self.semanas = self.group_positions(r['semana_prog'] for r in rows)
+        self.dias = self.group_positions(
+            (r['dia_prog'].lower() if r['dia_prog'] is not None else None) for r in rows
+        )
+
+    @staticmethod
+    def group_positions(values):
+        grupos = {}
+        for pos, value in enumerate(values):
+            if value is not None:
+                grupos.setdefault(value, []).append(pos)
+        return {value: np.array(pos, dtype=np.int64) for value, pos in grupos.items()}
+
+    @staticmethod
+    def union(arrays):
+        arrays = list(arrays)
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(arrays))
+
+    def match_text(self, field, query):
+        query = query.lower()
+        if len(query) >= self.NGRAM:
+            ngrams = self.ngrams[field]
+            grams = {query[i:i + self.NGRAM] for i in range(len(query) - self.NGRAM + 1)}
+            # Empezar por el trigrama menos frecuente achica la intersección desde el principio
+            candidatos = None
+            for gram in sorted(grams, key=lambda g: len(ngrams.get(g, ()))):
+                valores = ngrams.get(gram)
+                if not valores:
+                    return np.empty(0, dtype=np.int64)
+                candidatos = set(valores) if candidatos is None else candidatos & valores
+                if not candidatos:
+                    return np.empty(0, dtype=np.int64)
+        else:
+            candidatos = self.values[field].keys()
+        return self.union(self.values[field][v] for v in candidatos if query in v)
+
+    def search(self, limit=100, offset=0, cursor=None, count="exact", **filters):
+        """Mismos filtros y resultado que RecorridoRepository.get_filtered: (items, total, next_cursor)."""
+        if count not in KeysetCursor.COUNT_MODES:
+            raise InvalidCursorError(f"count inválido: {count}. Opciones: {', '.join(KeysetCursor.COUNT_MODES)}")
+        condiciones = []
+        if filters.get('vendedor'):
+            condiciones.append(self.match_text('vendedor', filters['vendedor']))
+        if filters.get('cliente'):
+            condiciones.append(self.match_text('cliente', filters['cliente']))
+        if filters.get('linea') and filters['linea'] != "all":
+            condiciones.append(self.match_text('linea_origen', filters['linea']))
+        if filters.get('bloque') and filters['bloque'] != "all":
+            condiciones.append(self.match_text('bloque', filters['bloque']))
+        if filters.get('semana') and filters['semana'] != 0:
+            condiciones.append(self.semanas.get(filters['semana'], np.empty(0, dtype=np.int64)))
+        if filters.get('dia') and filters['dia'] != "all":
+            condiciones.append(self.dias.get(filters['dia'].lower(), np.empty(0, dtype=np.int64)))
+
+        if condiciones:
+            posiciones = condiciones[0]
+            for otra in condiciones[1:]:
+                posiciones = np.intersect1d(posiciones, otra, assume_unique=True)
+        else:
+            posiciones = np.arange(len(self.rows), dtype=np.int64)
+
+        total = None if count == "none" else len(posiciones)
+        if cursor:
+            (c_id,) = KeysetCursor.decode(cursor, 1)
+            c_id = KeysetCursor.decode_id(c_id)
+            posiciones = posiciones[self.ids[posiciones] < c_id]
+        else:
+            posiciones = posiciones[offset:]
+        pagina = posiciones[:limit]
+        items = [self.rows[p] for p in pagina]
+        next_cursor = KeysetCursor.encode(items[-1]['id']) if len(posiciones) > limit else None
+        return items, total, next_cursor
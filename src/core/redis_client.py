@@ -1,72 +1,498 @@
 import redis
+import redis.asyncio as aioredis
+import asyncio
+import inspect
 import json
+import random
+import socket
 import threading
+import time
 import os
 import traceback
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 
 class RedisMicroservice:
-    def __init__(self, host='redis', port=6379, queue='sales_service'):
+    def __init__(self, host='redis', port=6379, queue='sales_service', workers=None, max_in_flight=None,
+                 executor=None):
+        """
+        workers: handlers en paralelo (REDIS_WORKERS, default 4).
+        max_in_flight: mensajes aceptados y todavía sin terminar, incluidos los que esperan turno
+            (REDIS_MAX_IN_FLIGHT, default 100). Al llegar al tope se deja de leer de Redis hasta que se libere lugar.
+        executor: 'thread' o 'process' (REDIS_EXECUTOR). Con 'process' los handlers y sus datos deben ser
+            serializables con pickle (funciones a nivel de módulo).
+        """
         self.redis_client = redis.Redis(host=host, port=port, decode_responses=True)
         self.queue = queue
         self.handlers = {}
         self.is_running = False
+        self.workers = workers or int(os.getenv("REDIS_WORKERS", 4))
+        self.max_in_flight = max_in_flight or int(os.getenv("REDIS_MAX_IN_FLIGHT", 100))
+        self.executor_kind = executor or os.getenv("REDIS_EXECUTOR", "thread")
+        if self.executor_kind not in ("thread", "process"):
+            raise ValueError(f"executor inválido: {self.executor_kind}. Opciones: thread, process")
+        self.reconnect_min = float(os.getenv("REDIS_RECONNECT_MIN", 0.5))
+        self.reconnect_max = float(os.getenv("REDIS_RECONNECT_MAX", 30))
+        self.executor = None
+        self.in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self.lock = threading.Lock()
+        self.limits = {}   # patrón -> máximo de handlers en paralelo
+        self.running = {}  # patrón -> handlers corriendo
+        self.waiting = {}  # patrón -> mensajes esperando turno (packet_id, data)
 
-    def on(self, pattern):
-        """Decorator to register a handler for a specific NestJS pattern."""
+    @staticmethod
+    def _key(pattern):
+        return json.dumps(pattern) if isinstance(pattern, (dict, list)) else pattern
+
+    def on(self, pattern, max_concurrency=None):
+        """Decorator to register a handler for a specific NestJS pattern.
+
+        max_concurrency limita cuántos mensajes de este patrón se procesan a la vez; el resto espera
+        su turno sin ocupar workers, así un patrón lento no acapara el pool.
+        """
         def decorator(handler):
-            self.handlers[json.dumps(pattern) if isinstance(pattern, (dict, list)) else pattern] = handler
+            key = self._key(pattern)
+            self.handlers[key] = handler
+            if max_concurrency:
+                self.limits[key] = max_concurrency
             return handler
         return decorator
 
     def listen(self):
-        print(f"[*] Redis Microservice listening on queue: {self.queue}")
+        """Pub/Sub bloqueante; si se cae la conexión reintenta con el mismo backoff que AsyncRedisMicroservice."""
         self.is_running = True
+        delay = self.reconnect_min
         while self.is_running:
+            # NestJS standard Redis transport uses Pub/Sub for 'emit' and 'send'.
+            pubsub = self.redis_client.pubsub()
             try:
-                # NestJS Microservices use LPUSH/BRPOP or similar for queues
-                # For Redis Transport, it usually uses a 'message' pattern
-                # But NestJS standard Redis transport uses Pub/Sub or Queues depending on config.
-                # In ddsoft, based on Gateway config, it seems to be standard Redis transport.
-                # Standard NestJS Redis transport uses Pub/Sub for 'emit' and 'send'.
-                
-                # Let's use Pub/Sub as it's the default for NestJS Redis Transport
-                pubsub = self.redis_client.pubsub()
                 pubsub.subscribe(self.queue)
-                
+                print(f"[*] Redis Microservice listening on queue: {self.queue}")
+                delay = self.reconnect_min
                 for message in pubsub.listen():
                     if message['type'] == 'message':
                         self._handle_message(message['data'])
             except Exception as e:
-                print(f"[!] Redis error: {e}")
-                traceback.print_exc()
+                print(f"[!] Redis error: {e} (reintento en {delay:.1f}s)")
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            if self.is_running:
+                time.sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(delay * 2, self.reconnect_max)
 
     def _handle_message(self, raw_data):
+        """Decodifica el paquete y lo deja en el pool; bloquea mientras haya max_in_flight mensajes sin terminar."""
         try:
             packet = json.loads(raw_data)
             pattern = packet.get('pattern')
             data = packet.get('data')
             packet_id = packet.get('id') # Only for 'send' (request-response)
 
-            key = json.dumps(pattern) if isinstance(pattern, (dict, list)) else pattern
-            
-            if key in self.handlers:
-                result = self.handlers[key](data)
-                
-                # If it's a request-response (has id), send response back
-                if packet_id:
-                    response = json.dumps({
-                        "id": packet_id,
-                        "response": result,
-                        "isDisposed": True
-                    })
-                    # Response is sent back to a specific response channel
-                    self.redis_client.publish(f"{self.queue}.res", response)
-            else:
+            key = self._key(pattern)
+
+            if key not in self.handlers:
                 print(f"[?] No handler for pattern: {pattern}")
+                return
+
+            # Backpressure: si el pool está lleno no se lee el próximo mensaje hasta que termine alguno
+            self.in_flight.acquire()
+            with self.lock:
+                limit = self.limits.get(key)
+                if limit and self.running.get(key, 0) >= limit:
+                    self.waiting.setdefault(key, deque()).append((packet_id, data))
+                    return
+                self.running[key] = self.running.get(key, 0) + 1
+            self._submit(key, packet_id, data)
         except Exception as e:
             print(f"[!] Error handling message: {e}")
             traceback.print_exc()
 
+    def _submit(self, key, packet_id, data):
+        try:
+            future = self.executor.submit(self.handlers[key], data)
+        except Exception as e:
+            # Pool cerrado o roto: se responde el error y se libera el lugar igual que al terminar
+            self._finish(key, packet_id, error=e)
+            return
+        future.add_done_callback(partial(self._on_done, key, packet_id))
+
+    def _on_done(self, key, packet_id, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._finish(key, packet_id, error=e)
+        else:
+            self._finish(key, packet_id, result=result)
+
+    def _finish(self, key, packet_id, result=None, error=None):
+        try:
+            if error is not None:
+                print(f"[!] Error handling message: {error}")
+                traceback.print_exception(error)
+            # If it's a request-response (has id), send response back
+            if packet_id:
+                self._reply(packet_id, result, error)
+        finally:
+            self.in_flight.release()
+            with self.lock:
+                pendientes = self.waiting.get(key)
+                siguiente = pendientes.popleft() if pendientes else None
+                if siguiente is None:
+                    self.running[key] -= 1
+            # El lugar del patrón pasa directo al siguiente mensaje en espera
+            if siguiente is not None:
+                self._submit(key, *siguiente)
+
+    def _reply(self, packet_id, result=None, error=None):
+        body = {"id": packet_id, "isDisposed": True}
+        if error is not None:
+            body["err"] = str(error)
+        else:
+            body["response"] = result
+        try:
+            # Response is sent back to a specific response channel
+            self.redis_client.publish(f"{self.queue}.res", json.dumps(body))
+        except Exception as e:
+            print(f"[!] Redis error sending response {packet_id}: {e}")
+
     def start(self):
+        if self.executor_kind == "process":
+            # spawn: el proceso padre tiene threads (uvicorn, pubsub) y fork no es seguro con ellos
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="redis-handler")
         self.thread = threading.Thread(target=self.listen, daemon=True)
         self.thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncRedisMicroservice:
+    """Transporte Pub/Sub de NestJS sobre redis.asyncio, corriendo en el event loop de la app.
+
+    Mismo registro de handlers que RedisMicroservice (on, max_concurrency). Los handlers async se esperan
+    en el loop; los sync van al pool (threads o procesos, igual que en RedisMicroservice) sin frenar el loop.
+    start()/stop() se llaman desde el lifespan de FastAPI. Si se cae la conexión se reintenta con backoff
+    exponencial (con jitter) hasta REDIS_RECONNECT_MAX segundos entre intentos.
+    """
+    def __init__(self, host='redis', port=6379, queue='sales_service', workers=None, max_in_flight=None,
+                 executor=None, shutdown_timeout=None):
+        self.redis_client = aioredis.Redis(host=host, port=port, decode_responses=True)
+        self.queue = queue
+        self.handlers = {}
+        self.limits = {}
+        self.is_running = False
+        self.workers = workers or int(os.getenv("REDIS_WORKERS", 4))
+        self.max_in_flight = max_in_flight or int(os.getenv("REDIS_MAX_IN_FLIGHT", 100))
+        self.executor_kind = executor or os.getenv("REDIS_EXECUTOR", "thread")
+        if self.executor_kind not in ("thread", "process"):
+            raise ValueError(f"executor inválido: {self.executor_kind}. Opciones: thread, process")
+        self.shutdown_timeout = shutdown_timeout or float(os.getenv("REDIS_SHUTDOWN_TIMEOUT", 30))
+        self.reconnect_min = float(os.getenv("REDIS_RECONNECT_MIN", 0.5))
+        self.reconnect_max = float(os.getenv("REDIS_RECONNECT_MAX", 30))
+        self.executor = None
+        self.listener = None
+        self.tasks = set()
+
+    def on(self, pattern, max_concurrency=None):
+        """Decorator to register a handler (sync or async) for a specific NestJS pattern."""
+        def decorator(handler):
+            key = RedisMicroservice._key(pattern)
+            self.handlers[key] = handler
+            if max_concurrency:
+                self.limits[key] = max_concurrency
+            return handler
+        return decorator
+
+    async def start(self):
+        if self.executor_kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="redis-handler")
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        self.pattern_limits = {key: asyncio.Semaphore(limit) for key, limit in self.limits.items()}
+        self.is_running = True
+        self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        delay = self.reconnect_min
+        while self.is_running:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.queue)
+                print(f"[*] Redis Microservice listening on queue: {self.queue}")
+                delay = self.reconnect_min
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        await self._handle_message(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[!] Redis error: {e} (reintento en {delay:.1f}s)")
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            if self.is_running:
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(delay * 2, self.reconnect_max)
+
+    async def _handle_message(self, raw_data):
+        try:
+            packet = json.loads(raw_data)
+            pattern = packet.get('pattern')
+            data = packet.get('data')
+            packet_id = packet.get('id') # Only for 'send' (request-response)
+
+            key = RedisMicroservice._key(pattern)
+            if key not in self.handlers:
+                print(f"[?] No handler for pattern: {pattern}")
+                return
+
+            # Backpressure: con max_in_flight mensajes sin terminar no se lee el siguiente
+            await self.in_flight.acquire()
+            task = asyncio.create_task(self._run(key, packet_id, data))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        except Exception as e:
+            print(f"[!] Error handling message: {e}")
+            traceback.print_exc()
+
+    async def _run(self, key, packet_id, data):
+        try:
+            limit = self.pattern_limits.get(key)
+            if limit is not None:
+                async with limit:
+                    result = await self._call(key, data)
+            else:
+                result = await self._call(key, data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Error handling message: {e}")
+            traceback.print_exception(e)
+            if packet_id:
+                await self._reply(packet_id, error=e)
+        else:
+            # If it's a request-response (has id), send response back
+            if packet_id:
+                await self._reply(packet_id, result)
+        finally:
+            self.in_flight.release()
+
+    async def _call(self, key, data):
+        handler = self.handlers[key]
+        if inspect.iscoroutinefunction(handler):
+            return await handler(data)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, handler, data)
+
+    async def _reply(self, packet_id, result=None, error=None):
+        body = {"id": packet_id, "isDisposed": True}
+        if error is not None:
+            body["err"] = str(error)
+        else:
+            body["response"] = result
+        try:
+            await self.redis_client.publish(f"{self.queue}.res", json.dumps(body))
+        except Exception as e:
+            print(f"[!] Redis error sending response {packet_id}: {e}")
+
+    async def stop(self):
+        """Deja de leer, espera los mensajes en curso (hasta shutdown_timeout) y cierra conexiones y pool."""
+        self.is_running = False
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+        if self.tasks:
+            _, pendientes = await asyncio.wait(self.tasks, timeout=self.shutdown_timeout)
+            for task in pendientes:
+                task.cancel()
+            if pendientes:
+                print(f"[!] {len(pendientes)} mensajes cancelados al cerrar")
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        await self.redis_client.aclose()
+
+
+class RedisStreamsMicroservice(AsyncRedisMicroservice):
+    """Transporte opcional sobre Redis Streams con consumer groups (REDIS_TRANSPORT=streams).
+
+    A diferencia de Pub/Sub, cada mensaje lo procesa un solo consumidor del grupo aunque haya N réplicas
+    o workers, y lo publicado mientras nadie escucha queda en el stream. Los productores agregan entradas
+    con XADD {queue}:stream packet=<mismo JSON que en Pub/Sub>; las respuestas siguen saliendo por
+    {queue}.res.
+
+    Una entrada se confirma (XACK) y se borra del stream (XDEL) cuando su handler termina bien, así el
+    stream solo guarda lo pendiente. Igual conviene que los productores usen XADD MAXLEN ~ N como tope
+    ante un consumidor caído por mucho tiempo (lo recortado antes de procesarse se pierde).
+
+    Si el handler falla o el consumidor muere, la entrada queda pendiente y otro consumidor la reclama con
+    XAUTOCLAIM después de REDIS_STREAM_CLAIM_IDLE_MS. Mientras un handler corre, el consumidor renueva
+    su claim (XCLAIM JUSTID) cada claim_idle_ms / 2, así un handler lento no se reprocesa en otra réplica.
+    Al superar REDIS_STREAM_MAX_DELIVERIES entregas (o si el paquete es inválido) pasa a {queue}:dead con
+    el error y se confirma. Es entrega al-menos-una-vez: un handler que se reintenta debe ser idempotente.
+    """
+    def __init__(self, host='redis', port=6379, queue='sales_service', group=None, consumer=None, **kwargs):
+        super().__init__(host=host, port=port, queue=queue, **kwargs)
+        self.stream = f"{queue}:stream"
+        self.dead_letter = f"{queue}:dead"
+        self.group = group or os.getenv("REDIS_STREAM_GROUP", "sales-service")
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = int(os.getenv("REDIS_STREAM_BATCH", 10))
+        self.block_ms = int(os.getenv("REDIS_STREAM_BLOCK_MS", 1000))
+        self.claim_idle_ms = int(os.getenv("REDIS_STREAM_CLAIM_IDLE_MS", 60000))
+        self.claim_interval = float(os.getenv("REDIS_STREAM_CLAIM_INTERVAL", 15))
+        self.max_deliveries = int(os.getenv("REDIS_STREAM_MAX_DELIVERIES", 5))
+        self.dead_letter_maxlen = int(os.getenv("REDIS_STREAM_DEAD_MAXLEN", 10000))
+        self.en_curso = set()  # Entradas que este consumidor está procesando: reclaim no las duplica
+
+    async def ensure_group(self):
+        try:
+            await self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def listen(self):
+        delay = self.reconnect_min
+        while self.is_running:
+            try:
+                await self.ensure_group()
+                print(f"[*] Redis Streams consumer {self.consumer} listening on {self.stream} (group {self.group})")
+                delay = self.reconnect_min
+                ultimo_reclamo = 0.0
+                loop = asyncio.get_running_loop()
+                while self.is_running:
+                    if loop.time() - ultimo_reclamo >= self.claim_interval:
+                        await self.reclaim()
+                        ultimo_reclamo = loop.time()
+                    # Leer como mucho lo que entra en el pool: el resto queda en el stream para otros consumidores
+                    disponibles = max(1, min(self.batch_size, self.max_in_flight - len(self.tasks)))
+                    respuesta = await self.redis_client.xreadgroup(
+                        self.group, self.consumer, {self.stream: ">"}, count=disponibles, block=self.block_ms
+                    )
+                    for _, entries in respuesta or []:
+                        for entry_id, fields in entries:
+                            await self._dispatch_entry(entry_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[!] Redis error: {e} (reintento en {delay:.1f}s)")
+            if self.is_running:
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(delay * 2, self.reconnect_max)
+
+    async def reclaim(self):
+        """Toma entradas pendientes de consumidores caídos o de handlers que fallaron."""
+        inicio = "0-0"
+        while True:
+            resultado = await self.redis_client.xautoclaim(
+                self.stream, self.group, self.consumer, min_idle_time=self.claim_idle_ms,
+                start_id=inicio, count=self.batch_size
+            )
+            inicio, entries = resultado[0], resultado[1]
+            for entry_id, fields in entries:
+                if entry_id in self.en_curso:
+                    continue
+                if fields is None:  # La entrada fue borrada del stream (XDEL/XTRIM)
+                    await self.redis_client.xack(self.stream, self.group, entry_id)
+                    continue
+                pendiente = await self.redis_client.xpending_range(
+                    self.stream, self.group, min=entry_id, max=entry_id, count=1
+                )
+                entregas = pendiente[0]["times_delivered"] if pendiente else 1
+                if entregas > self.max_deliveries:
+                    await self._dead_letter(entry_id, fields, f"Superó {self.max_deliveries} entregas")
+                    continue
+                await self._dispatch_entry(entry_id, fields)
+            if inicio in ("0-0", b"0-0") or not entries:
+                break
+
+    async def _dispatch_entry(self, entry_id, fields):
+        try:
+            packet = json.loads(fields.get("packet", ""))
+            key = RedisMicroservice._key(packet.get("pattern"))
+        except Exception as e:
+            await self._dead_letter(entry_id, fields, f"Paquete inválido: {e}")
+            return
+        if key not in self.handlers:
+            print(f"[?] No handler for pattern: {packet.get('pattern')}")
+            await self._dead_letter(entry_id, fields, "Sin handler para el patrón")
+            return
+        await self.in_flight.acquire()
+        self.en_curso.add(entry_id)
+        task = asyncio.create_task(self._run_entry(entry_id, fields, key, packet))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run_entry(self, entry_id, fields, key, packet):
+        packet_id = packet.get("id")
+        renovar = asyncio.create_task(self._keep_claim(entry_id))
+        try:
+            limit = self.pattern_limits.get(key)
+            if limit is not None:
+                async with limit:
+                    result = await self._call(key, packet.get("data"))
+            else:
+                result = await self._call(key, packet.get("data"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Sin XACK: queda pendiente y se reintenta vía reclaim hasta max_deliveries
+            print(f"[!] Error handling message {entry_id}: {e}")
+            traceback.print_exception(e)
+        else:
+            if packet_id:
+                await self._reply(packet_id, result)
+            await self._ack(entry_id)
+        finally:
+            renovar.cancel()
+            self.en_curso.discard(entry_id)
+            self.in_flight.release()
+
+    async def _keep_claim(self, entry_id):
+        """Renueva el claim de una entrada en curso para que XAUTOCLAIM de otra réplica no la tome."""
+        intervalo = self.claim_idle_ms / 2000
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                # JUSTID no incrementa el contador de entregas
+                await self.redis_client.xclaim(self.stream, self.group, self.consumer, min_idle_time=0,
+                                               message_ids=[entry_id], justid=True)
+            except Exception as e:
+                print(f"[!] Redis error renovando claim de {entry_id}: {e}")
+
+    async def _ack(self, entry_id):
+        """Confirma la entrada y la borra del stream: una vez procesada no hace falta conservarla."""
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.xack(self.stream, self.group, entry_id)
+        pipe.xdel(self.stream, entry_id)
+        await pipe.execute()
+
+    async def _dead_letter(self, entry_id, fields, motivo):
+        print(f"[!] Mensaje {entry_id} enviado a {self.dead_letter}: {motivo}")
+        await self.redis_client.xadd(
+            self.dead_letter, {**(fields or {}), "entry_id": entry_id, "error": motivo, "consumer": self.consumer},
+            maxlen=self.dead_letter_maxlen, approximate=True
+        )
+        await self._ack(entry_id)
+        try:
+            packet_id = json.loads(fields.get("packet", "")).get("id")
+        except Exception:
+            packet_id = None
+        if packet_id:
+            await self._reply(packet_id, error=motivo)
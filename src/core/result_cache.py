@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import redis
+
+OBJECT_COLUMNS_KEY = b"sales:object_columns"
+
+def frames_to_bytes(frames):
+    """Serializa una tupla de DataFrames como streams Arrow IPC: solo datos, leerlos no ejecuta código.
+
+    Encabezado: cantidad de frames (uint32) y el largo de cada stream (uint64), seguidos de los streams.
+    Arrow devuelve las columnas object de texto como str (y sus None como NaN): se anotan en la metadata
+    para restaurarlas como object con None.
+    """
+    partes = []
+    for df in frames:
+        objetos = [c for c in df.columns if df[c].dtype == object]
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               OBJECT_COLUMNS_KEY: json.dumps(objetos).encode()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        partes.append(sink.getvalue().to_pybytes())
+    return struct.pack(f"<I{len(partes)}Q", len(partes), *(len(p) for p in partes)) + b"".join(partes)
+
+def frames_from_bytes(blob):
+    """Inversa de frames_to_bytes; ValueError si el contenido no tiene ese formato."""
+    try:
+        (cantidad,) = struct.unpack_from("<I", blob)
+        largos = struct.unpack_from(f"<{cantidad}Q", blob, 4)
+        inicio = 4 + 8 * cantidad
+        if inicio + sum(largos) != len(blob):
+            raise ValueError("Largo inválido")
+        frames = []
+        for largo in largos:
+            table = pa.ipc.open_stream(blob[inicio:inicio + largo]).read_all()
+            inicio += largo
+            df = table.to_pandas()
+            objetos = json.loads((table.schema.metadata or {}).get(OBJECT_COLUMNS_KEY, b"[]"))
+            for columna in objetos:
+                df[columna] = pd.Series(table.column(columna).to_pylist(), index=df.index, dtype=object)
+            frames.append(df)
+        return tuple(frames)
+    except (struct.error, pa.ArrowException, KeyError, TypeError) as e:
+        raise ValueError(f"Resultado cacheado inválido: {e}") from e
+
+class MemoryResultCache:
+    """LRU en memoria acotado por bytes; guarda los resultados serializados con pickle (solo dentro del proceso)."""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            blob = self.items.get(key)
+            if blob is None:
+                return None
+            self.items.move_to_end(key)
+        return pickle.loads(blob)
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            anterior = self.items.pop(key, None)
+            if anterior is not None:
+                self.size -= len(anterior)
+            self.items[key] = blob
+            self.size += len(blob)
+            while self.size > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+
+class RedisResultCache:
+    """LRU en Redis: cada resultado en su propia key con TTL y un ZSET de accesos para desalojar los más viejos.
+
+    Redis es compartido con otros servicios: los resultados se guardan en Arrow IPC (frames_to_bytes), nunca
+    con pickle, para que una key escrita por otro no pueda ejecutar código al leerla.
+    """
+    def __init__(self, client, max_entries=32, ttl=24 * 3600, prefix='sales:validate:v2:'):
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lru_key = f"{prefix}lru"
+
+    def get(self, key):
+        try:
+            blob = self.client.get(self.prefix + key)
+            if blob is None:
+                return None
+            self.client.zadd(self.lru_key, {key: time.time()})
+            return frames_from_bytes(blob)
+        except redis.RedisError as e:
+            print(f"[!] Redis cache error (get): {e}")
+            return None
+        except ValueError as e:
+            print(f"[!] Redis cache: {e}")
+            return None
+
+    def set(self, key, value):
+        try:
+            blob = frames_to_bytes(value)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            # Columnas con tipos mezclados que Arrow no representa: ese resultado no se cachea
+            print(f"[!] Redis cache: resultado no serializable ({e})")
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.set(self.prefix + key, blob, ex=self.ttl)
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.zcard(self.lru_key)
+            total = pipe.execute()[-1]
+            if total > self.max_entries:
+                evicted = self.client.zpopmin(self.lru_key, total - self.max_entries)
+                if evicted:
+                    self.client.delete(*[self.prefix + (k.decode() if isinstance(k, bytes) else k) for k, _ in evicted])
+        except redis.RedisError as e:
+            print(f"[!] Redis cache error (set): {e}")
+
+def make_key(content, version_ruta, *params):
+    """Key direccionada por contenido: hash del archivo + versión de la ruta + parámetros."""
+    digest = hashlib.sha256(content).hexdigest()
+    return ":".join([digest, str(version_ruta)] + [str(p) for p in params])
+
+def build_result_cache():
+    """Crea el backend configurado en VALIDATE_CACHE_BACKEND (memory | redis | none)."""
+    backend = os.getenv("VALIDATE_CACHE_BACKEND", "memory").lower()
+    if backend == "none":
+        return None
+    if backend == "redis":
+        client = redis.Redis(host=os.getenv("REDIS_HOST", "redis"), port=int(os.getenv("REDIS_PORT", 6379)))
+        return RedisResultCache(
+            client,
+            max_entries=int(os.getenv("VALIDATE_CACHE_MAX_ENTRIES", 32)),
+            ttl=int(os.getenv("VALIDATE_CACHE_TTL", 24 * 3600))
+        )
+    return MemoryResultCache(max_bytes=int(os.getenv("VALIDATE_CACHE_MAX_MB", 256)) * 1024 * 1024)
+
+result_cache = build_result_cache()
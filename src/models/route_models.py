@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Float, ForeignKey
+from sqlalchemy import create_engine, Column, String, Integer, DateTime, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 import os
@@ -23,6 +23,12 @@ class RecorridoModel(Base):
     texto_original = Column(String)
     fecha_carga = Column(DateTime, default=datetime.utcnow)
 
+class RecorridoVersionModel(Base):
+    __tablename__ = "recorrido_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0)  # Se incrementa con cada cambio en recorridos
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow)
+
 class AxumGpsModel(Base):
     __tablename__ = "axum_gps"
     id = Column(Integer, primary_key=True, index=True)
@@ -31,6 +37,8 @@ class AxumGpsModel(Base):
     fecha_desde = Column(DateTime)
     fecha_hasta = Column(DateTime)
     semana_inicio = Column(Integer)  # Semana de inicio configurada (1 o 2)
+    total_visitas = Column(Integer)  # Calculado al guardar el batch
+    total_vendedores = Column(Integer)
     
     # Relationships
     frecuencias = relationship("FrecuenciaModel", back_populates="axum_gps", cascade="all, delete-orphan")
@@ -41,9 +49,12 @@ class AxumGpsModel(Base):
 class FrecuenciaHeaderModel(Base):
     __tablename__ = "frecuencia_header"
     id = Column(Integer, primary_key=True, index=True)
-    axum_gps_id = Column(Integer, ForeignKey("axum_gps.id"))
+    axum_gps_id = Column(Integer, ForeignKey("axum_gps.id"), index=True)
     vendedor = Column(String)
     tiempo_pdv_total = Column(String)  # Suma de tiempo_pdv_original
+    tiempo_pdv_total_seg = Column(Integer)  # Mismo total en segundos
+    total_clientes = Column(Integer)  # Clientes distintos visitados (calculado al guardar)
+    total_visitas = Column(Integer)
     
     # Relationships
     axum_gps = relationship("AxumGpsModel", back_populates="frecuencia_headers")
@@ -59,6 +70,8 @@ class FrecuenciaModel(Base):
     fecha_checkout = Column(DateTime)
     tiempo_pdv_original = Column(String)
     tiempo_pdv_limitado = Column(String)
+    tiempo_pdv_original_seg = Column(Integer)  # Segundos; NULL si el texto no es HH:MM:SS
+    tiempo_pdv_limitado_seg = Column(Integer)
     dia_real = Column(String)
     semana_real = Column(Integer)
     programacion = Column(String)
@@ -70,16 +83,27 @@ class FrecuenciaModel(Base):
     # Relationships
     axum_gps = relationship("AxumGpsModel", back_populates="frecuencias")
 
+# (axum_gps_id, vendedor) también cubre las búsquedas solo por axum_gps_id
+Index("ix_frecuencia_axum_gps_id_vendedor", FrecuenciaModel.axum_gps_id, FrecuenciaModel.vendedor)
+# Mismo orden que /frecuencia/recent y su paginación por clave (NULLS LAST en índices es propio de Postgres)
+Index(
+    "ix_frecuencia_fecha_checkin_id", FrecuenciaModel.fecha_checkin.desc().nulls_last(), FrecuenciaModel.id.desc()
+).ddl_if(dialect="postgresql")
+
 class HorasHeaderModel(Base):
     __tablename__ = "horas_header"
     id = Column(Integer, primary_key=True, index=True)
-    axum_gps_id = Column(Integer, ForeignKey("axum_gps.id"))
+    axum_gps_id = Column(Integer, ForeignKey("axum_gps.id"), index=True)
     vendedor = Column(String)
     horas_totales = Column(String) # HH:MM:SS
     dias_trabajados = Column(Integer)
     promedio_horas_diarias = Column(String) # HH:MM:SS
     promedio_checkin = Column(String) # HH:MM:SS
     promedio_checkout = Column(String) # HH:MM:SS
+    horas_totales_seg = Column(Integer)  # Mismos valores en segundos, para sumar/promediar en la base
+    promedio_horas_diarias_seg = Column(Integer)
+    promedio_checkin_seg = Column(Integer)
+    promedio_checkout_seg = Column(Integer)
     viatico = Column(Float, default=0.0)
     linea = Column(String)
 
@@ -89,17 +113,45 @@ class HorasHeaderModel(Base):
 class HorasDetalleModel(Base):
     __tablename__ = "horas"
     id = Column(Integer, primary_key=True, index=True)
-    axum_gps_id = Column(Integer, ForeignKey("axum_gps.id"))
+    axum_gps_id = Column(Integer, ForeignKey("axum_gps.id"), index=True)
     vendedor = Column(String)
     cliente = Column(String)  # Extraído del campo Codigo (ej: 23453.239 -> 23453)
     fecha = Column(DateTime)  # Día de trabajo
     primer_checkin = Column(DateTime)
     ultimo_checkout = Column(DateTime)
     total_horas_dia = Column(String)  # HH:MM:SS diferencia entre checkout y checkin
+    total_horas_dia_seg = Column(Integer)  # Misma diferencia en segundos
     
     # Relationships
     axum_gps = relationship("AxumGpsModel", back_populates="horas_detalle")
 
+class GescomLoteModel(Base):
+    __tablename__ = "gescom_lote"
+    id = Column(Integer, primary_key=True, index=True)
+    lote_id = Column(String, unique=True)
+    fecha_proceso = Column(DateTime, default=datetime.utcnow)
+    estado = Column(String)  # procesando, completado, error
+    total_registros = Column(Integer)  # Registros recibidos en el mensaje
+    insertados = Column(Integer, default=0)  # Se actualizan al confirmar cada chunk
+    rechazados = Column(Integer, default=0)
+    error = Column(String)
+
+    # Relationships
+    registros = relationship("GescomRegistroModel", back_populates="lote", cascade="all, delete-orphan")
+
+class GescomRegistroModel(Base):
+    __tablename__ = "gescom_registro"
+    id = Column(Integer, primary_key=True, index=True)
+    lote_id = Column(Integer, ForeignKey("gescom_lote.id"), index=True)
+    linea = Column(Integer)  # Posición del registro en el mensaje
+    vendedor = Column(String)
+    cliente = Column(String)
+    fecha = Column(DateTime)
+    datos = Column(String)  # Registro completo (claves normalizadas) en JSON
+
+    # Relationships
+    lote = relationship("GescomLoteModel", back_populates="registros")
+
 class ViaticoConfigModel(Base):
     __tablename__ = "viatico_config"
     id = Column(Integer, primary_key=True, index=True)
@@ -118,6 +170,9 @@ def init_db():
                 db.add(ViaticoConfigModel(zona="CABA_GBA", valor=0.0))
                 db.add(ViaticoConfigModel(zona="INTERIOR", valor=0.0))
                 db.commit()
+            if db.query(RecorridoVersionModel).count() == 0:
+                db.add(RecorridoVersionModel(id=1, version=0))
+                db.commit()
             db.close()
             print("Conexión a la base de datos exitosa.")
             break
@@ -0,0 +1,75 @@
+import csv
+import io
+import pandas as pd
+from sqlalchemy import insert, table as sql_table, column as sql_column, Integer, Float, DateTime, String
+
+class BulkInsertHelper:
+    @staticmethod
+    def parse_datetimes(values: pd.Series, fmt: str):
+        """Parsea toda la columna con `fmt`; lo que no calza se reintenta con inferencia de pandas."""
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        raw = values.where(values.notna() & (values.astype(str) != ''), None)
+        parsed = pd.to_datetime(raw, format=fmt, errors='coerce')
+        fallidos = parsed.isna() & raw.notna()
+        if fallidos.any():
+            parsed[fallidos] = pd.to_datetime(raw[fallidos], format='mixed')
+        return parsed
+
+    @staticmethod
+    def duration_seconds(values: pd.Series):
+        """Convierte textos HH:MM:SS (las horas pueden pasar de 24) a segundos; lo inválido queda NaN."""
+        texto = values.where(values.isna(), values.astype(str)).astype(object)
+        partes = texto.str.extract(r'^\s*([+-]?\d+)\s*:\s*([+-]?\d+)\s*:\s*([+-]?\d+)\s*$').astype(float)
+        return partes[0] * 3600 + partes[1] * 60 + partes[2]
+
+    @staticmethod
+    def to_columns(model, df: pd.DataFrame):
+        """Adapta cada columna del DataFrame al tipo de la columna del modelo y completa los defaults."""
+        table = model.__table__
+        df = df.copy()
+        for col in table.columns:
+            if col.name not in df.columns:
+                if col.default is not None and not col.primary_key:
+                    df[col.name] = col.default.arg(None) if col.default.is_callable else col.default.arg
+                continue
+            values = df[col.name]
+            if isinstance(col.type, DateTime):
+                df[col.name] = pd.to_datetime(values)
+            elif isinstance(col.type, Integer):
+                df[col.name] = pd.to_numeric(values).astype('Int64')
+            elif isinstance(col.type, Float):
+                df[col.name] = pd.to_numeric(values).astype('float64')
+            elif isinstance(col.type, String):
+                df[col.name] = values.where(values.isna(), values.astype(str)).astype(object)
+        return df[[c.name for c in table.columns if c.name in df.columns]]
+
+    @staticmethod
+    def insert_df(db, model, df: pd.DataFrame, table_name: str = None):
+        """Inserta el DataFrame en la transacción de `db`: COPY en Postgres, INSERT multi-fila en otros motores.
+
+        `table_name` permite cargar en una tabla con la misma estructura que la del modelo (ej. staging).
+        """
+        if df.empty:
+            return
+        df = BulkInsertHelper.to_columns(model, df)
+        conn = db.connection()
+        table = model.__table__
+        if table_name:
+            table = sql_table(table_name, *[sql_column(c) for c in df.columns])
+        if conn.dialect.name == 'postgresql':
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False, header=False, na_rep='\\N', quoting=csv.QUOTE_MINIMAL,
+                      date_format='%Y-%m-%d %H:%M:%S.%f')
+            buffer.seek(0)
+            columns = ", ".join(f'"{c}"' for c in df.columns)
+            sql = f"COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+            with conn.connection.dbapi_connection.cursor() as cursor:
+                if hasattr(cursor, 'copy_expert'):  # psycopg2
+                    cursor.copy_expert(sql, buffer)
+                else:  # psycopg 3
+                    with cursor.copy(sql) as copy:
+                        copy.write(buffer.getvalue())
+        else:
+            records = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+            conn.execute(insert(table), records)
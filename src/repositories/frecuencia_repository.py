@@ -1,13 +1,46 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
+from sqlalchemy import and_, or_, select, Integer
+from src.core.pagination import KeysetCursor
+from src.core.history_cache import HistoryCache
+from src.repositories.bulk_insert import BulkInsertHelper
 from src.models.route_models import (
     SessionLocal, AxumGpsModel, FrecuenciaHeaderModel, FrecuenciaModel, 
     HorasHeaderModel, HorasDetalleModel, ViaticoConfigModel
 )
 
 class FrecuenciaRepository:
+    # Claves del payload -> columnas de cada tabla
+    VISITAS_COLUMNS = {
+        'Vendedor': 'vendedor', 'Cliente': 'cliente', 'Fecha_Checkin': 'fecha_checkin',
+        'Fecha_Checkout': 'fecha_checkout', 'Tiempo_PDV_Original': 'tiempo_pdv_original',
+        'Tiempo_PDV_Limitado': 'tiempo_pdv_limitado', 'Dia_Real': 'dia_real', 'Semana_Real': 'semana_real',
+        'Programacion': 'programacion', 'Bloque': 'bloque', 'Linea': 'linea', 'Estado': 'estado'
+    }
+    HORAS_HEADER_COLUMNS = {
+        'Vendedor': 'vendedor', 'Horas_Totales': 'horas_totales', 'Dias_Trabajados': 'dias_trabajados',
+        'Promedio_Horas': 'promedio_horas_diarias', 'Promedio_Checkin': 'promedio_checkin',
+        'Promedio_Checkout': 'promedio_checkout', 'Viatico': 'viatico', 'Linea': 'linea'
+    }
+    # Tablas exportables de un batch (/history/{batch_id}/export)
+    EXPORT_MODELS = {'visitas': FrecuenciaModel, 'horas_resumen': HorasHeaderModel, 'horas_detalle': HorasDetalleModel}
+    EXPORT_CHUNK_ROWS = 5000
+    HORAS_DETALLE_COLUMNS = {
+        'vendedor': 'vendedor', 'cliente': 'cliente', 'fecha': 'fecha', 'primer_checkin': 'primer_checkin',
+        'ultimo_checkout': 'ultimo_checkout', 'total_horas_dia': 'total_horas_dia'
+    }
+
     @staticmethod
     def save_batch(visitas: list, horas_resumen: list, horas_detalle: list, metadata: dict):
+        return FrecuenciaRepository.save_batch_frames(
+            pd.DataFrame.from_records(visitas), pd.DataFrame.from_records(horas_resumen),
+            pd.DataFrame.from_records(horas_detalle), metadata
+        )
+
+    @staticmethod
+    def save_batch_frames(df_visitas: pd.DataFrame, df_horas_resumen: pd.DataFrame, df_horas_detalle: pd.DataFrame,
+                          metadata: dict):
+        """Guarda un batch a partir de los DataFrames del validador (mismas columnas que el payload de /save-batch)."""
         db = SessionLocal()
         try:
             batch_id = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
@@ -36,115 +69,63 @@ class FrecuenciaRepository:
             db.add(axum_gps)
             db.flush()
             
-            # 3. Frecuencia (Visitas detalladas)
-            for item in visitas:
-                f_checkin = item.get('Fecha_Checkin')
-                if isinstance(f_checkin, str):
-                    f_checkin = datetime.strptime(f_checkin, '%Y-%m-%d %H:%M:%S')
-                
-                f_checkout = item.get('Fecha_Checkout')
-                if isinstance(f_checkout, str):
-                    try: f_checkout = datetime.strptime(f_checkout, '%Y-%m-%d %H:%M:%S')
-                    except: f_checkout = pd.to_datetime(f_checkout)
-
-                db_frec = FrecuenciaModel(
-                    axum_gps_id=axum_gps.id,
-                    batch_id=batch_id,
-                    vendedor=item.get('Vendedor'),
-                    cliente=item.get('Cliente'),
-                    fecha_checkin=f_checkin,
-                    fecha_checkout=f_checkout,
-                    tiempo_pdv_original=item.get('Tiempo_PDV_Original'),
-                    tiempo_pdv_limitado=item.get('Tiempo_PDV_Limitado'),
-                    dia_real=item.get('Dia_Real'),
-                    semana_real=item.get('Semana_Real'),
-                    programacion=item.get('Programacion'),
-                    bloque=item.get('Bloque'),
-                    linea=item.get('Linea'),
-                    estado=item.get('Estado')
-                )
-                db.add(db_frec)
+            # 3. Frecuencia (Visitas detalladas): columnas armadas una vez e insertadas en bloque
+            df_visitas = df_visitas.reindex(columns=list(FrecuenciaRepository.VISITAS_COLUMNS))
+            df_visitas = df_visitas.rename(columns=FrecuenciaRepository.VISITAS_COLUMNS)
+            df_visitas['fecha_checkin'] = BulkInsertHelper.parse_datetimes(df_visitas['fecha_checkin'], '%Y-%m-%d %H:%M:%S')
+            df_visitas['fecha_checkout'] = BulkInsertHelper.parse_datetimes(df_visitas['fecha_checkout'], '%Y-%m-%d %H:%M:%S')
+            df_visitas['tiempo_pdv_original_seg'] = BulkInsertHelper.duration_seconds(df_visitas['tiempo_pdv_original'])
+            df_visitas['tiempo_pdv_limitado_seg'] = BulkInsertHelper.duration_seconds(df_visitas['tiempo_pdv_limitado'])
+            df_visitas['axum_gps_id'] = axum_gps.id
+            df_visitas['batch_id'] = batch_id
+            BulkInsertHelper.insert_df(db, FrecuenciaModel, df_visitas)
             
             # 4. Calcular Frecuencia_Header (Agregación por vendedor)
-            # Agrupar visitas por vendedor y sumar tiempo_pdv_original
-            vendedor_totals = {}
-            for item in visitas:
-                vendedor = item.get('Vendedor')
-                tiempo_str = item.get('Tiempo_PDV_Original', '00:00:00')
-                
-                # Convertir tiempo a timedelta para sumar
-                try:
-                    parts = tiempo_str.split(':')
-                    if len(parts) == 3:
-                        td = timedelta(hours=int(parts[0]), minutes=int(parts[1]), seconds=int(parts[2]))
-                    else:
-                        td = timedelta(0)
-                except:
-                    td = timedelta(0)
-                
-                if vendedor not in vendedor_totals:
-                    vendedor_totals[vendedor] = timedelta(0)
-                vendedor_totals[vendedor] += td
+            # Agrupar visitas por vendedor y sumar tiempo_pdv_original (HH:MM:SS; lo inválido cuenta 0)
+            segundos = df_visitas['tiempo_pdv_original_seg'].fillna(0)
+            vendedor_totals = segundos.groupby(df_visitas['vendedor'], sort=False, dropna=False).sum()
+            # Conteos por vendedor precalculados para que el resumen del batch no tenga que agregar visitas
+            clientes = df_visitas['cliente'].where(df_visitas['cliente'].isna(), df_visitas['cliente'].astype(str))
+            por_vendedor = clientes.groupby(df_visitas['vendedor'], sort=False, dropna=False)
+            clientes_count = por_vendedor.nunique()
+            visitas_count = por_vendedor.size()
             
             # Guardar agregaciones
-            for vendedor, total_td in vendedor_totals.items():
-                total_seconds = int(total_td.total_seconds())
-                tiempo_total_str = f"{total_seconds//3600:02}:{(total_seconds%3600)//60:02}:{total_seconds%60:02}"
-                
-                db_frec_header = FrecuenciaHeaderModel(
-                    axum_gps_id=axum_gps.id,
-                    vendedor=vendedor,
-                    tiempo_pdv_total=tiempo_total_str
-                )
-                db.add(db_frec_header)
+            df_frec_header = pd.DataFrame({
+                'axum_gps_id': axum_gps.id,
+                'vendedor': vendedor_totals.index,
+                'tiempo_pdv_total': [
+                    f"{int(total)//3600:02}:{(int(total)%3600)//60:02}:{int(total)%60:02}" for total in vendedor_totals
+                ],
+                'tiempo_pdv_total_seg': vendedor_totals.astype(int).to_numpy(),
+                'total_clientes': clientes_count.reindex(vendedor_totals.index).to_numpy(),
+                'total_visitas': visitas_count.reindex(vendedor_totals.index).to_numpy()
+            })
+            BulkInsertHelper.insert_df(db, FrecuenciaHeaderModel, df_frec_header)
+            axum_gps.total_visitas = len(df_visitas)
+            axum_gps.total_vendedores = len(df_frec_header)
                 
             # 5. Horas Resumen (horas_header)
-            for h in horas_resumen:
-                db_hora_header = HorasHeaderModel(
-                    axum_gps_id=axum_gps.id,
-                    vendedor=h.get('Vendedor'),
-                    horas_totales=h.get('Horas_Totales'),
-                    dias_trabajados=h.get('Dias_Trabajados'),
-                    promedio_horas_diarias=h.get('Promedio_Horas'),
-                    promedio_checkin=h.get('Promedio_Checkin'),
-                    promedio_checkout=h.get('Promedio_Checkout'),
-                    viatico=h.get('Viatico', 0.0),
-                    linea=h.get('Linea', '')
-                )
-                db.add(db_hora_header)
+            df_horas_header = df_horas_resumen.reindex(columns=list(FrecuenciaRepository.HORAS_HEADER_COLUMNS))
+            df_horas_header = df_horas_header.rename(columns=FrecuenciaRepository.HORAS_HEADER_COLUMNS)
+            df_horas_header['viatico'] = df_horas_header['viatico'].fillna(0.0)
+            df_horas_header['linea'] = df_horas_header['linea'].fillna('')
+            for col in ('horas_totales', 'promedio_horas_diarias', 'promedio_checkin', 'promedio_checkout'):
+                df_horas_header[f'{col}_seg'] = BulkInsertHelper.duration_seconds(df_horas_header[col])
+            df_horas_header['axum_gps_id'] = axum_gps.id
+            BulkInsertHelper.insert_df(db, HorasHeaderModel, df_horas_header)
             
             # 6. Horas Detalle Diario (horas)
-            for detalle in horas_detalle:
-                # Parse fecha
-                fecha_dt = detalle.get('fecha')
-                if isinstance(fecha_dt, str):
-                    try: fecha_dt = datetime.strptime(fecha_dt, '%Y-%m-%d')
-                    except: fecha_dt = pd.to_datetime(fecha_dt)
-                
-                # Parse primer_checkin
-                primer_checkin_dt = detalle.get('primer_checkin')
-                if isinstance(primer_checkin_dt, str):
-                    try: primer_checkin_dt = datetime.strptime(primer_checkin_dt, '%Y-%m-%d %H:%M:%S')
-                    except: primer_checkin_dt = pd.to_datetime(primer_checkin_dt)
-                
-                # Parse ultimo_checkout
-                ultimo_checkout_dt = detalle.get('ultimo_checkout')
-                if isinstance(ultimo_checkout_dt, str):
-                    try: ultimo_checkout_dt = datetime.strptime(ultimo_checkout_dt, '%Y-%m-%d %H:%M:%S')
-                    except: ultimo_checkout_dt = pd.to_datetime(ultimo_checkout_dt)
-                
-                db_hora_detalle = HorasDetalleModel(
-                    axum_gps_id=axum_gps.id,
-                    vendedor=detalle.get('vendedor'),
-                    cliente=detalle.get('cliente'),
-                    fecha=fecha_dt,
-                    primer_checkin=primer_checkin_dt,
-                    ultimo_checkout=ultimo_checkout_dt,
-                    total_horas_dia=detalle.get('total_horas_dia')
-                )
-                db.add(db_hora_detalle)
+            df_horas = df_horas_detalle.reindex(columns=list(FrecuenciaRepository.HORAS_DETALLE_COLUMNS))
+            df_horas['fecha'] = BulkInsertHelper.parse_datetimes(df_horas['fecha'], '%Y-%m-%d')
+            df_horas['primer_checkin'] = BulkInsertHelper.parse_datetimes(df_horas['primer_checkin'], '%Y-%m-%d %H:%M:%S')
+            df_horas['ultimo_checkout'] = BulkInsertHelper.parse_datetimes(df_horas['ultimo_checkout'], '%Y-%m-%d %H:%M:%S')
+            df_horas['total_horas_dia_seg'] = BulkInsertHelper.duration_seconds(df_horas['total_horas_dia'])
+            df_horas['axum_gps_id'] = axum_gps.id
+            BulkInsertHelper.insert_df(db, HorasDetalleModel, df_horas)
                 
             db.commit()
+            HistoryCache.invalidate()
             return batch_id
         except Exception as e:
             db.rollback()
@@ -153,17 +134,39 @@ class FrecuenciaRepository:
             db.close()
 
     @staticmethod
-    def get_history():
+    def get_history(limit: int = None, cursor: str = None, desde: datetime = None, hasta: datetime = None):
+        """Batches procesados, del más reciente al más antiguo.
+
+        Pagina por clave sobre (fecha_proceso DESC, id DESC). `desde`/`hasta` filtran los batches cuyo
+        período (fecha_desde - fecha_hasta) se cruza con el rango. Devuelve (items, next_cursor).
+        """
         db = SessionLocal()
         try:
-            items = db.query(AxumGpsModel).order_by(AxumGpsModel.fecha_proceso.desc()).all()
+            query = db.query(AxumGpsModel)
+            if desde:
+                query = query.filter(or_(AxumGpsModel.fecha_hasta.is_(None), AxumGpsModel.fecha_hasta >= desde))
+            if hasta:
+                query = query.filter(or_(AxumGpsModel.fecha_desde.is_(None), AxumGpsModel.fecha_desde <= hasta))
+            if cursor:
+                c_fecha, c_id = KeysetCursor.decode(cursor, 2)
+                c_fecha, c_id = KeysetCursor.decode_datetime(c_fecha), KeysetCursor.decode_id(c_id)
+                query = query.filter(or_(
+                    AxumGpsModel.fecha_proceso < c_fecha,
+                    and_(AxumGpsModel.fecha_proceso == c_fecha, AxumGpsModel.id < c_id)
+                ))
+            query = query.order_by(AxumGpsModel.fecha_proceso.desc(), AxumGpsModel.id.desc())
+            items = query.limit(limit + 1).all() if limit else query.all()
+            next_cursor = None
+            if limit and len(items) > limit:
+                items = items[:limit]
+                next_cursor = KeysetCursor.encode(items[-1].fecha_proceso, items[-1].id)
             return [{
                 "id": item.id,
                 "batch_id": item.batch_id,
                 "fecha_desde": item.fecha_desde.strftime("%Y-%m-%d") if item.fecha_desde else None,
                 "fecha_hasta": item.fecha_hasta.strftime("%Y-%m-%d") if item.fecha_hasta else None,
                 "fecha_proceso": item.fecha_proceso.strftime("%Y-%m-%d %H:%M:%S")
-            } for item in items]
+            } for item in items], next_cursor
         finally:
             db.close()
 
@@ -206,14 +209,56 @@ class FrecuenciaRepository:
                     "fecha_desde": axum_gps.fecha_desde,
                     "fecha_hasta": axum_gps.fecha_hasta,
                 },
-                "visitas": [v.__dict__ for v in visitas],
+                "visitas": [FrecuenciaRepository.to_dict(v) for v in visitas],
                 "frecuencia_headers": [{"vendedor": f.vendedor, "tiempo_pdv_total": f.tiempo_pdv_total} for f in frecuencia_headers],
-                "horas_resumen": [h.__dict__ for h in horas_resumen],
-                "horas_detalle": [h.__dict__ for h in horas_detalle]
+                "horas_resumen": [FrecuenciaRepository.to_dict(h) for h in horas_resumen],
+                "horas_detalle": [FrecuenciaRepository.to_dict(h) for h in horas_detalle]
             }
         finally:
             db.close()
     
+    @staticmethod
+    def to_dict(item):
+        """Solo las columnas de la tabla (sin el estado interno de SQLAlchemy que trae __dict__)."""
+        return {c.name: getattr(item, c.name) for c in item.__table__.columns}
+
+    @staticmethod
+    def get_axum_gps_id(batch_id: str):
+        db = SessionLocal()
+        try:
+            return db.query(AxumGpsModel.id).filter(AxumGpsModel.batch_id == batch_id).scalar()
+        finally:
+            db.close()
+
+    @staticmethod
+    def iter_batch_table(axum_gps_id: int, tabla: str, chunk_rows: int = None):
+        """Lee una tabla del batch con cursor del lado del servidor y la entrega en DataFrames de `chunk_rows` filas.
+
+        Si no hay filas entrega un DataFrame vacío con las columnas, para que el export tenga encabezado.
+        """
+        chunk_rows = chunk_rows or FrecuenciaRepository.EXPORT_CHUNK_ROWS
+        table = FrecuenciaRepository.EXPORT_MODELS[tabla].__table__
+        columns = [c for c in table.columns if c.name != 'axum_gps_id']
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                select(*columns).where(table.c.axum_gps_id == axum_gps_id).order_by(table.c.id),
+                execution_options={"stream_results": True, "yield_per": chunk_rows}
+            )
+            keys = list(result.keys())
+            # Enteros con NULL quedarían como float: se usan enteros nullable
+            enteros = [c.name for c in columns if isinstance(c.type, Integer)]
+            vacio = True
+            for rows in result.partitions(chunk_rows):
+                vacio = False
+                df = pd.DataFrame(rows, columns=keys)
+                df[enteros] = df[enteros].astype('Int64')
+                yield df
+            if vacio:
+                yield pd.DataFrame(columns=keys)
+        finally:
+            db.close()
+
     @staticmethod
     def get_batch_details_with_cliente_count(batch_id: str):
         """Obtiene detalles de un batch incluyendo conteo de clientes únicos por vendedor (SOLO RESUMEN)"""
@@ -222,31 +267,35 @@ class FrecuenciaRepository:
             axum_gps = db.query(AxumGpsModel).filter(AxumGpsModel.batch_id == batch_id).first()
             if not axum_gps: return None
             
-            # Obtener frecuencia_headers
+            # Obtener frecuencia_headers (los conteos se calculan al guardar el batch)
             frecuencia_headers = db.query(FrecuenciaHeaderModel).filter(
                 FrecuenciaHeaderModel.axum_gps_id == axum_gps.id
             ).all()
-            
-            # Contar clientes únicos por vendedor usando una query agregada (más eficiente)
-            from sqlalchemy import func, distinct
-            vendedor_stats = db.query(
-                FrecuenciaModel.vendedor,
-                func.count(distinct(FrecuenciaModel.cliente)).label('total_clientes')
-            ).filter(
-                FrecuenciaModel.axum_gps_id == axum_gps.id
-            ).group_by(FrecuenciaModel.vendedor).all()
-            
-            # Crear un diccionario de vendedor -> total_clientes
-            vendedor_clientes_count = {stat.vendedor: stat.total_clientes for stat in vendedor_stats}
+
+            total_visitas = axum_gps.total_visitas
+            if total_visitas is None or any(h.total_clientes is None for h in frecuencia_headers):
+                # Batch guardado antes de precalcular los conteos: se agregan las visitas como antes
+                from sqlalchemy import func, distinct
+                vendedor_stats = db.query(
+                    FrecuenciaModel.vendedor,
+                    func.count(distinct(FrecuenciaModel.cliente)).label('total_clientes')
+                ).filter(
+                    FrecuenciaModel.axum_gps_id == axum_gps.id
+                ).group_by(FrecuenciaModel.vendedor).all()
+                vendedor_clientes_count = {stat.vendedor: stat.total_clientes for stat in vendedor_stats}
+                for header in frecuencia_headers:
+                    if header.total_clientes is None:
+                        header.total_clientes = vendedor_clientes_count.get(header.vendedor, 0)
+                if total_visitas is None:
+                    total_visitas = db.query(FrecuenciaModel).filter(FrecuenciaModel.axum_gps_id == axum_gps.id).count()
             
             # Construir response con headers y conteo de clientes
             headers_with_count = []
             for header in frecuencia_headers:
-                total_clientes = vendedor_clientes_count.get(header.vendedor, 0)
                 headers_with_count.append({
                     "vendedor": header.vendedor,
                     "tiempo_pdv_total": header.tiempo_pdv_total,
-                    "total_clientes": total_clientes
+                    "total_clientes": header.total_clientes
                 })
             
             # NO cargamos todos los detalles de frecuencia para evitar cargar 25k+ registros
@@ -257,7 +306,7 @@ class FrecuenciaRepository:
                 "fecha_hasta": axum_gps.fecha_hasta.strftime("%Y-%m-%d") if axum_gps.fecha_hasta else None,
                 "fecha_proceso": axum_gps.fecha_proceso.strftime("%Y-%m-%d %H:%M:%S") if axum_gps.fecha_proceso else None,
                 "frecuencia_headers": headers_with_count,
-                "total_visitas": db.query(FrecuenciaModel).filter(FrecuenciaModel.axum_gps_id == axum_gps.id).count()
+                "total_visitas": total_visitas
             }
         finally:
             db.close()
@@ -285,6 +334,8 @@ class FrecuenciaRepository:
                     "promedio_horas_diarias": hora.promedio_horas_diarias,
                     "promedio_checkin": hora.promedio_checkin,
                     "promedio_checkout": hora.promedio_checkout,
+                    "horas_totales_seg": hora.horas_totales_seg,
+                    "promedio_horas_diarias_seg": hora.promedio_horas_diarias_seg,
                     "viatico": hora.viatico,
                     "linea": hora.linea
                 })
@@ -300,8 +351,12 @@ class FrecuenciaRepository:
             db.close()
     
     @staticmethod
-    def get_recent_frecuencia(limit: int = 50, vendedor: str = None, cliente: str = None, batch_id: str = None):
-        """Obtiene las últimas N visitas de frecuencia con filtros opcionales"""
+    def get_recent_frecuencia(limit: int = 50, vendedor: str = None, cliente: str = None, batch_id: str = None,
+                              cursor: str = None, count: str = "none"):
+        """Obtiene las últimas N visitas de frecuencia con filtros opcionales.
+
+        Pagina por clave sobre (fecha_checkin DESC, id DESC): `cursor` es el next_cursor de la página anterior.
+        """
         db = SessionLocal()
         try:
             query = db.query(FrecuenciaModel)
@@ -317,8 +372,30 @@ class FrecuenciaRepository:
                 if axum_gps:
                     query = query.filter(FrecuenciaModel.axum_gps_id == axum_gps.id)
             
-            # Ordenar por fecha más reciente y limitar
-            visitas = query.order_by(FrecuenciaModel.fecha_checkin.desc()).limit(limit).all()
+            total = KeysetCursor.count(db, query, FrecuenciaModel.__tablename__, count,
+                                       filtered=bool(vendedor or cliente or batch_id))
+
+            if cursor:
+                c_fecha, c_id = KeysetCursor.decode(cursor, 2)
+                c_id = KeysetCursor.decode_id(c_id)
+                if c_fecha is None:
+                    query = query.filter(FrecuenciaModel.fecha_checkin.is_(None), FrecuenciaModel.id < c_id)
+                else:
+                    c_fecha = KeysetCursor.decode_datetime(c_fecha)
+                    query = query.filter(or_(
+                        FrecuenciaModel.fecha_checkin < c_fecha,
+                        and_(FrecuenciaModel.fecha_checkin == c_fecha, FrecuenciaModel.id < c_id),
+                        FrecuenciaModel.fecha_checkin.is_(None)
+                    ))
+
+            # Ordenar por fecha más reciente (id desempata) y traer una fila extra para saber si hay más
+            visitas = query.order_by(
+                FrecuenciaModel.fecha_checkin.desc().nulls_last(), FrecuenciaModel.id.desc()
+            ).limit(limit + 1).all()
+            next_cursor = None
+            if len(visitas) > limit:
+                visitas = visitas[:limit]
+                next_cursor = KeysetCursor.encode(visitas[-1].fecha_checkin, visitas[-1].id)
             
             # Construir response
             visitas_data = []
@@ -343,6 +420,8 @@ class FrecuenciaRepository:
             return {
                 "visitas": visitas_data,
                 "total": len(visitas_data),
+                "total_filtrado": total,
+                "next_cursor": next_cursor,
                 "filtros_aplicados": {
                     "vendedor": vendedor,
                     "cliente": cliente,
@@ -380,6 +459,7 @@ class FrecuenciaRepository:
                 resumen.append({
                     "vendedor": h.vendedor,
                     "tiempo_pdv_total": h.tiempo_pdv_total,
+                    "tiempo_pdv_total_seg": h.tiempo_pdv_total_seg,
                     "batch_id": h.axum_gps.batch_id if h.axum_gps else batch_id
                 })
             
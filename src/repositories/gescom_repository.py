@@ -0,0 +1,75 @@
+import uuid
+import pandas as pd
+from datetime import datetime
+from src.models.route_models import SessionLocal, GescomLoteModel, GescomRegistroModel
+from src.repositories.bulk_insert import BulkInsertHelper
+
+class GescomRepository:
+    @staticmethod
+    def create_lote(total_registros: int):
+        """Crea el lote en estado procesando y lo confirma; devuelve (id, lote_id)."""
+        db = SessionLocal()
+        try:
+            # Varios mensajes pueden llegar en el mismo segundo: el sufijo evita choques en lote_id
+            lote_id = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            lote = GescomLoteModel(lote_id=lote_id, estado="procesando", total_registros=total_registros,
+                                   insertados=0, rechazados=0)
+            db.add(lote)
+            db.commit()
+            return lote.id, lote_id
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+
+    @staticmethod
+    def save_chunk(db, lote_pk: int, df: pd.DataFrame, rechazados: int):
+        """Inserta un chunk y actualiza los contadores del lote en la misma transacción; confirma al final."""
+        try:
+            BulkInsertHelper.insert_df(db, GescomRegistroModel, df.assign(lote_id=lote_pk))
+            db.query(GescomLoteModel).filter(GescomLoteModel.id == lote_pk).update({
+                GescomLoteModel.insertados: GescomLoteModel.insertados + len(df),
+                GescomLoteModel.rechazados: GescomLoteModel.rechazados + rechazados
+            }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+    @staticmethod
+    def finish_lote(lote_pk: int):
+        db = SessionLocal()
+        try:
+            db.query(GescomLoteModel).filter(GescomLoteModel.id == lote_pk).update(
+                {GescomLoteModel.estado: "completado", GescomLoteModel.fecha_proceso: datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+
+    @staticmethod
+    def discard_lote(lote_pk: int, error: str):
+        """Borra los chunks ya confirmados de un lote que falló y lo deja en estado error.
+
+        Así un reintento del mismo mensaje no duplica registros.
+        """
+        db = SessionLocal()
+        try:
+            db.query(GescomRegistroModel).filter(GescomRegistroModel.lote_id == lote_pk).delete(
+                synchronize_session=False
+            )
+            db.query(GescomLoteModel).filter(GescomLoteModel.id == lote_pk).update(
+                {GescomLoteModel.estado: "error", GescomLoteModel.insertados: 0, GescomLoteModel.error: error[:1000]},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
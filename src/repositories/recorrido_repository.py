@@ -1,31 +1,88 @@
 import pandas as pd
-from src.models.route_models import SessionLocal, RecorridoModel
+from datetime import datetime
+from sqlalchemy import func, text
+from src.models.route_models import SessionLocal, RecorridoModel, RecorridoVersionModel
+from src.core.recorrido_cache import RecorridoCache
+from src.core.pagination import KeysetCursor
+from src.repositories.bulk_insert import BulkInsertHelper
 
 class RecorridoRepository:
+    # Columnas de df_prog -> columnas de la tabla recorridos
+    DF_COLUMNS = {
+        'Clave': 'clave', 'Vendedor': 'vendedor', 'Cliente': 'cliente', 'Dia_Prog': 'dia_prog',
+        'Semana_Prog': 'semana_prog', 'Bloque': 'bloque', 'Linea_Origen': 'linea_origen',
+        'Texto_Original': 'texto_original'
+    }
+
+    @staticmethod
+    def bump_version(db):
+        """Incrementa la versión del recorrido dentro de la transacción en curso."""
+        updated = db.query(RecorridoVersionModel).filter(RecorridoVersionModel.id == 1).update({
+            RecorridoVersionModel.version: RecorridoVersionModel.version + 1,
+            RecorridoVersionModel.fecha_actualizacion: datetime.utcnow()
+        }, synchronize_session=False)
+        if not updated:
+            db.add(RecorridoVersionModel(id=1, version=1))
+
+    @staticmethod
+    def get_version():
+        db = SessionLocal()
+        try:
+            item = db.query(RecorridoVersionModel).filter(RecorridoVersionModel.id == 1).first()
+            return item.version if item else 0
+        finally:
+            db.close()
+
     @staticmethod
     def save_all(df_prog: pd.DataFrame):
         db = SessionLocal()
         try:
-            db.query(RecorridoModel).delete()
-            for _, row in df_prog.iterrows():
-                db_item = RecorridoModel(
-                    clave=row['Clave'],
-                    vendedor=row['Vendedor'],
-                    cliente=row['Cliente'],
-                    dia_prog=row['Dia_Prog'],
-                    semana_prog=row['Semana_Prog'],
-                    bloque=row['Bloque'],
-                    linea_origen=row['Linea_Origen'],
-                    texto_original=row['Texto_Original']
-                )
-                db.add(db_item)
+            df = df_prog.rename(columns=RecorridoRepository.DF_COLUMNS)[list(RecorridoRepository.DF_COLUMNS.values())]
+            if db.get_bind().dialect.name == 'postgresql':
+                RecorridoRepository.swap_from_staging(db, df)
+            else:
+                db.query(RecorridoModel).delete()
+                BulkInsertHelper.insert_df(db, RecorridoModel, df)
+            RecorridoRepository.bump_version(db)
             db.commit()
+            RecorridoCache.invalidate()
         except Exception as e:
             db.rollback()
             raise e
         finally:
             db.close()
 
+    @staticmethod
+    def swap_from_staging(db, df: pd.DataFrame):
+        """Carga la ruta en una tabla staging, la indexa y la intercambia por `recorridos`.
+
+        Todo ocurre en la transacción de `db`: hasta el commit las lecturas siguen viendo la ruta
+        anterior, y el lock exclusivo sobre `recorridos` se toma recién para el rename final.
+        """
+        table = RecorridoModel.__tablename__
+        staging = f"{table}_staging"
+        db.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        db.execute(text(f"CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)"))
+        BulkInsertHelper.insert_df(db, RecorridoModel, df, table_name=staging)
+
+        # Índices después de la carga; nombres temporales hasta que desaparezca la tabla vieja
+        db.execute(text(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_pkey PRIMARY KEY (id)"))
+        for index in RecorridoModel.__table__.indexes:
+            columns = ", ".join(c.name for c in index.columns)
+            db.execute(text(f"CREATE INDEX {index.name}_staging ON {staging} ({columns})"))
+        db.execute(text(f"ANALYZE {staging}"))
+
+        sequence = db.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table}).scalar()
+        db.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+        if sequence:
+            # La secuencia del id pertenece a la tabla vieja: la pasamos a la nueva antes del DROP
+            db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {staging}.id"))
+        db.execute(text(f"DROP TABLE {table}"))
+        db.execute(text(f"ALTER TABLE {staging} RENAME TO {table}"))
+        db.execute(text(f"ALTER INDEX {staging}_pkey RENAME TO {table}_pkey"))
+        for index in RecorridoModel.__table__.indexes:
+            db.execute(text(f"ALTER INDEX {index.name}_staging RENAME TO {index.name}"))
+
     @staticmethod
     def get_all_as_df():
         db = SessionLocal()
@@ -48,26 +105,57 @@ class RecorridoRepository:
             db.close()
 
     @staticmethod
-    def get_filtered(limit=100, offset=0, **filters):
+    def get_filtered(limit=100, offset=0, cursor=None, count="exact", **filters):
+        """Lista recorridos ordenados por id DESC.
+
+        Los filtros de texto buscan el texto literal como subcadena sin distinguir mayúsculas: '%' y '_'
+        no son comodines (igual que en RecorridoSearchIndex). `dia` compara el valor completo.
+
+        Con `cursor` (next_cursor de la página anterior) pagina por clave en lugar de usar `offset`.
+        Devuelve (items, total, next_cursor); total es None si count="none".
+        """
         db = SessionLocal()
         try:
             query = db.query(RecorridoModel)
             if filters.get('vendedor'):
-                query = query.filter(RecorridoModel.vendedor.ilike(f"%{filters['vendedor']}%"))
+                query = query.filter(RecorridoModel.vendedor.icontains(filters['vendedor'], autoescape=True))
             if filters.get('cliente'):
-                query = query.filter(RecorridoModel.cliente.ilike(f"%{filters['cliente']}%"))
+                query = query.filter(RecorridoModel.cliente.icontains(filters['cliente'], autoescape=True))
             if filters.get('linea') and filters['linea'] != "all":
-                query = query.filter(RecorridoModel.linea_origen.ilike(f"%{filters['linea']}%"))
+                query = query.filter(RecorridoModel.linea_origen.icontains(filters['linea'], autoescape=True))
             if filters.get('bloque') and filters['bloque'] != "all":
-                query = query.filter(RecorridoModel.bloque.ilike(f"%{filters['bloque']}%"))
+                query = query.filter(RecorridoModel.bloque.icontains(filters['bloque'], autoescape=True))
             if filters.get('semana') and filters['semana'] != 0:
                 query = query.filter(RecorridoModel.semana_prog == filters['semana'])
             if filters.get('dia') and filters['dia'] != "all":
-                query = query.filter(RecorridoModel.dia_prog.ilike(f"{filters['dia']}"))
+                query = query.filter(func.lower(RecorridoModel.dia_prog) == filters['dia'].lower())
             
-            total = query.count()
-            items = query.order_by(RecorridoModel.id.desc()).offset(offset).limit(limit).all()
-            return items, total
+            filtered = query.whereclause is not None
+            total = KeysetCursor.count(db, query, RecorridoModel.__tablename__, count, filtered=filtered)
+            query = query.order_by(RecorridoModel.id.desc())
+            if cursor:
+                (c_id,) = KeysetCursor.decode(cursor, 1)
+                c_id = KeysetCursor.decode_id(c_id)
+                query = query.filter(RecorridoModel.id < c_id)
+            else:
+                query = query.offset(offset)
+            items = query.limit(limit + 1).all()
+            next_cursor = None
+            if len(items) > limit:
+                items = items[:limit]
+                next_cursor = KeysetCursor.encode(items[-1].id)
+            return items, total, next_cursor
+        finally:
+            db.close()
+
+    @staticmethod
+    def get_all_rows():
+        """Todas las filas como dicts (mismas claves que el modelo), ordenadas por id DESC."""
+        db = SessionLocal()
+        try:
+            table = RecorridoModel.__table__
+            rows = db.execute(table.select().order_by(table.c.id.desc())).mappings().all()
+            return [dict(row) for row in rows]
         finally:
             db.close()
 
@@ -85,7 +173,9 @@ class RecorridoRepository:
         try:
             db_item = RecorridoModel(**data)
             db.add(db_item)
+            RecorridoRepository.bump_version(db)
             db.commit()
+            RecorridoCache.invalidate()
             db.refresh(db_item)
             return db_item
         finally:
@@ -100,7 +190,9 @@ class RecorridoRepository:
                 return None
             for key, value in data.items():
                 setattr(db_item, key, value)
+            RecorridoRepository.bump_version(db)
             db.commit()
+            RecorridoCache.invalidate()
             db.refresh(db_item)
             return db_item
         finally:
@@ -114,7 +206,9 @@ class RecorridoRepository:
             if not db_item:
                 return False
             db.delete(db_item)
+            RecorridoRepository.bump_version(db)
             db.commit()
+            RecorridoCache.invalidate()
             return True
         finally:
             db.close()
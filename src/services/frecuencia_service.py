@@ -1,6 +1,9 @@
 from src.repositories.frecuencia_repository import FrecuenciaRepository
+from src.core.history_cache import HistoryCache
 
 class FrecuenciaService:
+    EXPORT_TABLAS = tuple(FrecuenciaRepository.EXPORT_MODELS)
+
     @staticmethod
     def process_and_save_batch(visitas: list, horas_resumen: list, horas_detalle: list, metadata: dict):
         viaticos = FrecuenciaRepository.get_viatico_configs()
@@ -20,8 +23,27 @@ class FrecuenciaService:
         return batch_id
 
     @staticmethod
-    def get_history():
-        return FrecuenciaRepository.get_history()
+    def process_and_save_frames(df_res, df_horas_resumen, df_horas_detalle, metadata: dict):
+        """Igual que process_and_save_batch pero con los DataFrames del validador, sin pasar por JSON."""
+        viaticos = FrecuenciaRepository.get_viatico_configs()
+        v_map = {v.zona: v.valor for v in viaticos}
+
+        # Copia: los DataFrames pueden venir del caché de resultados de /validate
+        df_horas_resumen = df_horas_resumen.copy()
+        es_interior = df_horas_resumen['Linea'].fillna('').astype(str).str.upper().str.contains('INTERIOR', regex=False)
+        viatico = es_interior.map({True: v_map.get('INTERIOR', 0.0), False: v_map.get('CABA_GBA', 0.0)})
+        aplica = df_horas_resumen['Aplica_Viatico'].fillna(False).astype(bool)
+        df_horas_resumen['Viatico'] = viatico.where(aplica, 0.0).astype(float)
+
+        batch_id = FrecuenciaRepository.save_batch_frames(df_res, df_horas_resumen, df_horas_detalle, metadata)
+        return batch_id
+
+    @staticmethod
+    def get_history(limit: int = None, cursor: str = None, desde=None, hasta=None):
+        """Devuelve (items, next_cursor); la primera página sin filtros sale del cache"""
+        if cursor is None and desde is None and hasta is None:
+            return HistoryCache.get(limit, lambda: FrecuenciaRepository.get_history(limit))
+        return FrecuenciaRepository.get_history(limit, cursor, desde, hasta)
 
     @staticmethod
     def get_viatico_configs():
@@ -35,15 +57,25 @@ class FrecuenciaService:
     def get_batch_details(batch_id: str):
         return FrecuenciaRepository.get_batch_details_with_cliente_count(batch_id)
     
+    @staticmethod
+    def get_axum_gps_id(batch_id: str):
+        return FrecuenciaRepository.get_axum_gps_id(batch_id)
+
+    @staticmethod
+    def iter_batch_table(axum_gps_id: int, tabla: str):
+        """Filas de una tabla del batch en DataFrames por bloques, leídas con cursor del servidor"""
+        return FrecuenciaRepository.iter_batch_table(axum_gps_id, tabla)
+
     @staticmethod
     def get_batch_hours(batch_id: str):
         """Obtiene el resumen de horas de un batch específico"""
         return FrecuenciaRepository.get_batch_hours(batch_id)
     
     @staticmethod
-    def get_recent_frecuencia(limit: int = 50, vendedor: str = None, cliente: str = None, batch_id: str = None):
+    def get_recent_frecuencia(limit: int = 50, vendedor: str = None, cliente: str = None, batch_id: str = None,
+                              cursor: str = None, count: str = "none"):
         """Obtiene las últimas N visitas de frecuencia con filtros"""
-        return FrecuenciaRepository.get_recent_frecuencia(limit, vendedor, cliente, batch_id)
+        return FrecuenciaRepository.get_recent_frecuencia(limit, vendedor, cliente, batch_id, cursor, count)
     
     @staticmethod
     def get_frecuencia_summary(vendedor: str = None, batch_id: str = None):
@@ -0,0 +1,135 @@
+import json
+import os
+import time
+import pandas as pd
+from collections import Counter
+from pandas.tseries.api import guess_datetime_format
+from src.models.route_models import SessionLocal
+from src.repositories.gescom_repository import GescomRepository
+from src.services.validator_service import ValidatorService
+
+class GescomService:
+    CHUNK_ROWS = int(os.getenv("GESCOM_CHUNK_ROWS", 5000))
+    MUESTRA_RECHAZOS = 20
+    # Campo normalizado -> claves aceptadas en el registro (ya normalizadas)
+    CAMPOS = {
+        'vendedor': ('vendedor', 'cod_vendedor', 'codigo_vendedor', 'id_vendedor'),
+        'cliente': ('cliente', 'cod_cliente', 'codigo_cliente', 'id_cliente'),
+        'fecha': ('fecha', 'fecha_comprobante', 'fecha_venta'),
+    }
+
+    @staticmethod
+    def normalizar_clave(clave):
+        return str(clave).strip().lower().replace(' ', '_')
+
+    @staticmethod
+    def parse_fechas(valores: pd.Series):
+        """Parsea con el formato inferido de la primera fecha del chunk; lo que no calza se reintenta mixto.
+
+        Devuelve las fechas y la máscara de valores no vacíos (para distinguir vacías de inválidas).
+        """
+        raw = valores.where(valores.notna(), None).astype(object)
+        raw = raw.where(raw.isna(), raw.astype(str).str.strip())
+        raw = raw.where(raw != '', None)
+        muestra = raw.dropna()
+        if muestra.empty:
+            return pd.Series(pd.NaT, index=valores.index, dtype='datetime64[ns]'), raw.notna()
+        # utc=True admite fechas con y sin zona en el mismo chunk; todo queda en UTC sin zona
+        fmt = guess_datetime_format(muestra.iloc[0], dayfirst=True)
+        if fmt and fmt.startswith('%Y'):  # Con el año adelante (ISO) dayfirst invierte mes y día
+            fmt = guess_datetime_format(muestra.iloc[0])
+        parsed = pd.to_datetime(raw, format=fmt or 'mixed', errors='coerce', utc=True)
+        fallidos = parsed.isna() & raw.notna()
+        if fmt and fallidos.any():
+            parsed[fallidos] = pd.to_datetime(raw[fallidos], format='mixed', errors='coerce', utc=True)
+        parsed = parsed.dt.tz_convert(None)
+        return parsed, raw.notna()
+
+    @classmethod
+    def normalize_chunk(cls, registros: list, inicio: int):
+        """Valida y normaliza un chunk de registros.
+
+        Devuelve el DataFrame para gescom_registro, un Counter de motivos de rechazo y los rechazos
+        (linea, motivo) de este chunk.
+        """
+        motivos, rechazos = Counter(), []
+        lineas, filas = [], []
+        for offset, registro in enumerate(registros):
+            if not isinstance(registro, dict):
+                motivos['El registro no es un objeto'] += 1
+                rechazos.append({'linea': inicio + offset, 'motivo': 'El registro no es un objeto'})
+                continue
+            lineas.append(inicio + offset)
+            filas.append({cls.normalizar_clave(k): v for k, v in registro.items()})
+
+        df = pd.DataFrame({'linea': pd.Series(lineas, dtype='int64')})
+        crudo = pd.DataFrame.from_records(filas) if filas else pd.DataFrame(index=df.index)
+        for campo, claves in cls.CAMPOS.items():
+            # Cada registro puede usar un alias distinto: primer valor no nulo por fila entre los alias
+            valores = crudo.reindex(columns=list(claves)).astype(object).bfill(axis=1).iloc[:, 0]
+            if campo == 'fecha':
+                df[campo], con_fecha = cls.parse_fechas(valores)
+            else:
+                ids = ValidatorService.limpiar_ids(valores.where(valores.notna(), 'nan').astype(str))
+                df[campo] = ids.where(ids != '', None)
+        df['datos'] = [json.dumps(f, ensure_ascii=False, default=str) for f in filas]
+
+        invalidos = pd.Series('', index=df.index, dtype=object)
+        if not df.empty:
+            invalidos[df['vendedor'].isna() & df['cliente'].isna()] = 'Sin vendedor ni cliente'
+            invalidos[(invalidos == '') & con_fecha & df['fecha'].isna()] = 'Fecha inválida'
+        malos = invalidos != ''
+        if malos.any():
+            motivos.update(invalidos[malos].value_counts().to_dict())
+            rechazos.extend({'linea': int(l), 'motivo': m} for l, m in zip(df.loc[malos, 'linea'], invalidos[malos]))
+        return df[~malos].reset_index(drop=True), motivos, rechazos
+
+    @classmethod
+    def ingest(cls, data):
+        """Carga un mensaje de Gescom por chunks de CHUNK_ROWS registros, un chunk por transacción.
+
+        Solo un chunk normalizado vive en memoria a la vez; la lista recibida no se modifica. Si un chunk
+        falla se descartan los ya confirmados (el lote queda en estado error) y se relanza la excepción
+        original, aunque el descarte también falle.
+        """
+        registros = data if isinstance(data, list) else [data]
+        total = len(registros)
+        lote_pk, lote_id = GescomRepository.create_lote(total)
+        chunks = max(1, -(-total // cls.CHUNK_ROWS))
+        insertados, motivos, muestra = 0, Counter(), []
+        inicio_carga = time.monotonic()
+
+        db = SessionLocal()
+        try:
+            for numero, inicio in enumerate(range(0, total, cls.CHUNK_ROWS), start=1):
+                fin = min(inicio + cls.CHUNK_ROWS, total)
+                df, motivos_chunk, rechazos = cls.normalize_chunk(registros[inicio:fin], inicio)
+                GescomRepository.save_chunk(db, lote_pk, df, fin - inicio - len(df))
+
+                insertados += len(df)
+                motivos.update(motivos_chunk)
+                muestra.extend(rechazos[:cls.MUESTRA_RECHAZOS - len(muestra)])
+                transcurrido = time.monotonic() - inicio_carga
+                print(f"[*] Gescom {lote_id}: chunk {numero}/{chunks} ({fin}/{total} registros, "
+                      f"{insertados} insertados, {sum(motivos.values())} rechazados, "
+                      f"{fin / transcurrido if transcurrido else 0:.0f} reg/s)")
+        except Exception as e:
+            db.close()
+            try:
+                GescomRepository.discard_lote(lote_pk, str(e))
+            except Exception as cleanup:
+                print(f"[!] Gescom {lote_id}: no se pudo descartar el lote ({cleanup})")
+            raise e
+        db.close()
+        GescomRepository.finish_lote(lote_pk)
+
+        return {
+            "status": "processed",
+            "lote_id": lote_id,
+            "received": total,
+            "insertados": insertados,
+            "rechazados": sum(motivos.values()),
+            "motivos": dict(motivos),
+            "muestra_rechazos": muestra,
+            "chunks": chunks if total else 0,
+        }
@@ -1,6 +1,8 @@
 import pandas as pd
 from src.repositories.recorrido_repository import RecorridoRepository
 from src.services.validator_service import ValidatorService
+from src.core.recorrido_cache import RecorridoCache
+from src.core.recorrido_index import RecorridoIndexCache, RecorridoSearchIndex
 
 class RecorridoService:
     @staticmethod
@@ -11,8 +13,12 @@ class RecorridoService:
         return df_prog
 
     @staticmethod
-    def get_all_recorridos(limit=100, offset=0, **filters):
-        return RecorridoRepository.get_filtered(limit=limit, offset=offset, **filters)
+    def get_all_recorridos(limit=100, offset=0, cursor=None, count="exact", **filters):
+        # Los filtros se resuelven sobre el índice en memoria; se reconstruye cuando cambia la versión del recorrido
+        index = RecorridoIndexCache.get(
+            RecorridoRepository.get_version(), lambda: RecorridoSearchIndex(RecorridoRepository.get_all_rows())
+        )
+        return index.search(limit=limit, offset=offset, cursor=cursor, count=count, **filters)
 
     @staticmethod
     def get_recorrido_by_id(recorrido_id: int):
@@ -33,3 +39,18 @@ class RecorridoService:
     @staticmethod
     def get_recorrido_from_db():
         return RecorridoRepository.get_all_as_df()
+
+    @staticmethod
+    def get_version():
+        return RecorridoRepository.get_version()
+
+    @staticmethod
+    def get_recorrido_preparado(version: int = None):
+        """Devuelve (df_prog, prog_preparado) desde cache mientras no cambie la versión del recorrido."""
+        def cargar():
+            df_prog = RecorridoRepository.get_all_as_df()
+            prog_preparado = ValidatorService.preparar_prog(df_prog) if not df_prog.empty else None
+            return df_prog, prog_preparado
+        if version is None:
+            version = RecorridoRepository.get_version()
+        return RecorridoCache.get(version, cargar)
@@ -0,0 +1,44 @@
+import hashlib
+from src.core.result_cache import result_cache, make_key
+from src.services.recorrido_service import RecorridoService
+from src.services.validator_service import ValidatorService
+
+class RecorridoVacioError(ValueError):
+    pass
+
+class ValidationService:
+    @staticmethod
+    def run(horario_content, recorrido_content=None, fecha_inicio="01/10/2025", fecha_fin="30/11/2025",
+            semana_inicio: int = 1):
+        """Ejecuta la validación completa, reutilizando resultados cacheados para el mismo archivo y parámetros.
+
+        Devuelve (df_res, df_horas_resumen, df_horas_detalle).
+        """
+        if recorrido_content is not None:
+            version_ruta = f"file:{hashlib.sha256(recorrido_content).hexdigest()}"
+        else:
+            version = RecorridoService.get_version()
+            version_ruta = f"db:{version}"
+
+        key = make_key(horario_content, version_ruta, fecha_inicio, fecha_fin, semana_inicio)
+        if result_cache is not None:
+            cached = result_cache.get(key)
+            if cached is not None:
+                return cached
+
+        prog_preparado = None
+        if recorrido_content is not None:
+            df_prog = ValidatorService.procesar_recorrido(recorrido_content)
+        else:
+            df_prog, prog_preparado = RecorridoService.get_recorrido_preparado(version)
+            if df_prog.empty:
+                raise RecorridoVacioError("No hay datos de recorrido.")
+
+        df_res, df_horas_resumen, df_horas_detalle, _ = ValidatorService.procesar_con_df_prog(
+            df_prog, horario_content, fecha_inicio, fecha_fin, semana_inicio=semana_inicio,
+            prog_preparado=prog_preparado
+        )
+        result = (df_res, df_horas_resumen, df_horas_detalle)
+        if result_cache is not None:
+            result_cache.set(key, result)
+        return result
@@ -1,9 +1,17 @@
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+from openpyxl import load_workbook
+from itertools import islice
 from datetime import datetime, timedelta
-import re
 import io
 
 class ValidatorService:
+    DIAS_ESP = {0: 'Lunes', 1: 'Martes', 2: 'Miercoles', 3: 'Jueves', 4: 'Viernes', 5: 'Sabado', 6: 'Domingo'}
+    COLUMNAS_HORARIO = ('Codigo', 'Vendedor', 'Fecha Checkin', 'Fecha Checkout', 'Tiempo en PDV', 'Es Valido')
+    COLUMNAS_HORARIO_REQUERIDAS = ('Fecha Checkin', 'Fecha Checkout', 'Tiempo en PDV', 'Es Valido')
+    FILAS_POR_BLOQUE = 20000
+
     @staticmethod
     def limpiar_id(valor):
         try:
@@ -15,51 +23,159 @@ class ValidatorService:
         except:
             return str(valor).strip()
 
+    @staticmethod
+    def limpiar_ids(valores):
+        """Versión columnar de limpiar_id para una Series de strings."""
+        val_str = valores.str.strip()
+        return val_str.str.extract(r'^([^.]*)', expand=False).where(val_str.str.lower() != 'nan', '')
+
+    @classmethod
+    def extraer_ids(cls, df_horario):
+        """Obtiene Cliente_Clean y Vendedor_Final de 'Vendedor' y 'Codigo' (formato cliente.vendedor)."""
+        cliente_final = pd.Series(None, index=df_horario.index, dtype=object)
+        vendedor_final = pd.Series(None, index=df_horario.index, dtype=object)
+
+        # Prioridad 1: Columna 'Vendedor'
+        if 'Vendedor' in df_horario.columns:
+            v_val = df_horario['Vendedor']
+            v_str = v_val[v_val.notna()].astype(str)
+            v_str = v_str[(v_str.str.strip() != '') & (v_str.str.lower() != 'nan')]
+            vendedor_final[v_str.index] = cls.limpiar_ids(v_str)
+
+        # Prioridad 2: Columna 'Codigo' (formato cliente.vendedor)
+        if 'Codigo' in df_horario.columns:
+            cod_val = df_horario['Codigo']
+            parts = cod_val[cod_val.notna()].astype(str).str.extract(r'^(?P<cliente>[^.]*)(?P<punto>\.?)(?P<vendedor>[^.]*)')
+            cliente_final[parts.index] = cls.limpiar_ids(parts['cliente'])
+
+            sin_vendedor = vendedor_final[parts.index].isna() | (vendedor_final[parts.index] == '')
+            fallback = parts[sin_vendedor & (parts['punto'] == '.')]
+            vendedor_final[fallback.index] = cls.limpiar_ids(fallback['vendedor'])
+
+        return pd.DataFrame({'Cliente_Clean': cliente_final, 'Vendedor_Final': vendedor_final})
+
     @classmethod
     def procesar_recorrido(cls, file_content):
         try:
             df = pd.read_excel(io.BytesIO(file_content))
-            programacion = []
             col_vendedores = 'Vendedores'
             col_cliente = 'Cliente'
-            
-            for _, row in df.iterrows():
-                vendedores_raw = str(row[col_vendedores])
-                if pd.isna(row[col_vendedores]) or vendedores_raw.lower() == 'nan': continue
-                lista_vendedores = [v.strip() for v in vendedores_raw.split('-') if v.strip()]
-                cliente = cls.limpiar_id(row[col_cliente])
-                bloque = row.get('Bloque', 'Sin Bloque')
-                
-                for idx, vend in enumerate(lista_vendedores):
-                    numero_linea = idx + 1
-                    if numero_linea > 3: break 
-                    nombre_col = f'Linea {numero_linea}'
-                    if nombre_col in row and pd.notna(row[nombre_col]):
-                        contenido = str(row[nombre_col]).strip()
-                        if contenido.lower() == 'nan' or not contenido: continue
-                        dias_asignados = [d.strip() for d in contenido.split(',') if d.strip()]
-                        for dia_str in dias_asignados:
-                            match = re.match(r'([a-zA-ZáéíóúÁÉÍÓÚñÑ]+)\s+(\d+)', dia_str)
-                            if match:
-                                dia_nombre = match.group(1) 
-                                sem_numero = int(match.group(2))
-                                vend_limpio = cls.limpiar_id(vend)
-                                programacion.append({
-                                    'Clave': f"{cliente}_{vend_limpio}_{dia_nombre}_{sem_numero}", 
-                                    'Vendedor': vend_limpio,
-                                    'Cliente': cliente,
-                                    'Dia_Prog': dia_nombre,
-                                    'Semana_Prog': sem_numero,
-                                    'Bloque': bloque,
-                                    'Linea_Origen': nombre_col,
-                                    'Texto_Original': dia_str
-                                })
-            return pd.DataFrame(programacion)
+
+            df = df[df[col_vendedores].notna() & (df[col_vendedores].astype(str).str.lower() != 'nan')]
+
+            # Un registro por vendedor: su posición en 'Vendedores' define la 'Linea N' que le toca
+            vendedores = df[col_vendedores].astype(str).str.split('-').explode().str.strip()
+            vendedores = vendedores[vendedores != '']
+            numero_linea = vendedores.groupby(level=0).cumcount() + 1
+            vendedores, numero_linea = vendedores[numero_linea <= 3], numero_linea[numero_linea <= 3]
+
+            # Contenido de cada 'Linea N' en formato largo: (fila, numero_linea) -> texto
+            cols_linea = [f'Linea {n}' for n in (1, 2, 3) if f'Linea {n}' in df.columns]
+            contenido = df[cols_linea].rename(columns=lambda c: int(c.split(' ')[1])).stack()
+            contenido = contenido[contenido.notna()].astype(str).str.strip()
+            contenido = contenido[(contenido.str.lower() != 'nan') & (contenido != '')]
+            clave_linea = pd.MultiIndex.from_arrays([vendedores.index, numero_linea])
+
+            asignaciones = pd.DataFrame({
+                'Fila': vendedores.index,
+                'Vendedor': cls.limpiar_ids(vendedores).to_numpy(),
+                'Linea_Origen': ('Linea ' + numero_linea.astype(str)).to_numpy(),
+                'Texto_Original': contenido.reindex(clave_linea).to_numpy()
+            }).dropna(subset=['Texto_Original'])
+
+            # Un registro por token de día ("Lunes 1, Jueves 2")
+            asignaciones['Texto_Original'] = asignaciones['Texto_Original'].str.split(',')
+            programacion = asignaciones.explode('Texto_Original', ignore_index=True)
+            programacion['Texto_Original'] = programacion['Texto_Original'].str.strip()
+            programacion = programacion[programacion['Texto_Original'] != '']
+            dia_sem = programacion['Texto_Original'].str.extract(r'^([a-zA-ZáéíóúÁÉÍÓÚñÑ]+)\s+(\d+)')
+            programacion = programacion[dia_sem[0].notna()]
+            dia_sem = dia_sem[dia_sem[0].notna()]
+            if programacion.empty:
+                return pd.DataFrame()
+
+            clientes = cls.limpiar_ids(df[col_cliente].astype(str).fillna('nan'))
+            bloques = df['Bloque'] if 'Bloque' in df.columns else pd.Series('Sin Bloque', index=df.index)
+            cliente = clientes.reindex(programacion['Fila']).to_numpy()
+            semana = dia_sem[1].astype(int)
+            return pd.DataFrame({
+                'Clave': cliente + '_' + programacion['Vendedor'] + '_' + dia_sem[0] + '_' + semana.astype(str),
+                'Vendedor': programacion['Vendedor'],
+                'Cliente': cliente,
+                'Dia_Prog': dia_sem[0],
+                'Semana_Prog': semana,
+                'Bloque': bloques.reindex(programacion['Fila']).to_numpy(),
+                'Linea_Origen': programacion['Linea_Origen'],
+                'Texto_Original': programacion['Texto_Original']
+            }).reset_index(drop=True)
         except Exception as e:
             raise ValueError(f"Error procesando archivo Recorrido: {e}")
 
+    @staticmethod
+    def convertir_celda(valor):
+        """Tipado de una celda leída con openpyxl: '' -> None, float entero -> int y el resto tal cual.
+
+        A diferencia de pd.read_excel, el texto con forma de número queda como str: un Codigo guardado como
+        texto "20100.270" no pasa a 20100.27 y conserva el vendedor "270".
+        """
+        if valor == '':
+            return None
+        if isinstance(valor, float) and valor.is_integer():
+            return int(valor)
+        return valor
+
+    @staticmethod
+    def parsear_fechas(valores, formatos, columna):
+        """Parsea fechas DD/MM/AAAA con un formato explícito, detectado una vez por columna y cacheado."""
+        if columna not in formatos:
+            muestra = next((v for v in valores if isinstance(v, str) and v.strip()), None)
+            if muestra is not None:
+                formatos[columna] = guess_datetime_format(muestra.strip(), dayfirst=True)
+        formato = formatos.get(columna)
+        if formato:
+            return pd.to_datetime(valores, format=formato, errors='coerce')
+        return pd.to_datetime(valores, dayfirst=True, errors='coerce')
+
     @classmethod
-    def procesar_con_df_prog(cls, df_prog, horario_content, fecha_inicio_str, fecha_fin_str, semana_inicio: int = 1):
+    def leer_horario(cls, horario_content, f_ini, f_fin):
+        """Lee el Excel de horario en modo streaming: solo COLUMNAS_HORARIO y solo filas dentro de [f_ini, f_fin]."""
+        wb = load_workbook(io.BytesIO(horario_content), read_only=True, data_only=True)
+        try:
+            filas = wb.worksheets[0].iter_rows(values_only=True)
+            encabezado = next(filas, ())
+            posiciones = {}
+            for idx, nombre in enumerate(encabezado):
+                if nombre in cls.COLUMNAS_HORARIO:
+                    posiciones.setdefault(nombre, idx)
+            for nombre in cls.COLUMNAS_HORARIO_REQUERIDAS:
+                if nombre not in posiciones:
+                    raise KeyError(nombre)
+
+            columnas = list(posiciones)
+            indices = list(posiciones.values())
+            formatos = {}
+            bloques = []
+            while True:
+                bloque = [
+                    [cls.convertir_celda(fila[i]) if i < len(fila) else None for i in indices]
+                    for fila in islice(filas, cls.FILAS_POR_BLOQUE)
+                ]
+                df = pd.DataFrame(bloque, columns=columnas, dtype=object)
+                df['Fecha Checkin'] = cls.parsear_fechas(df['Fecha Checkin'], formatos, 'Fecha Checkin')
+                df['Fecha Checkout'] = cls.parsear_fechas(df['Fecha Checkout'], formatos, 'Fecha Checkout')
+                # Descartamos lo que está fuera de rango antes de leer el siguiente bloque
+                df = df[(df['Fecha Checkin'] >= f_ini) & (df['Fecha Checkin'] <= f_fin)]
+                if not bloques or not df.empty:
+                    bloques.append(df)
+                if len(bloque) < cls.FILAS_POR_BLOQUE:
+                    break
+        finally:
+            wb.close()
+        return pd.concat(bloques, ignore_index=True)
+
+    @classmethod
+    def procesar_con_df_prog(cls, df_prog, horario_content, fecha_inicio_str, fecha_fin_str, semana_inicio: int = 1,
+                             prog_preparado: dict = None):
         try:
             f_ini = datetime.strptime(fecha_inicio_str, "%d/%m/%Y")
             f_fin = datetime.strptime(fecha_fin_str, "%d/%m/%Y")
@@ -69,62 +185,31 @@ class ValidatorService:
 
         if df_prog is None or df_prog.empty:
             raise ValueError("No se encontraron datos válidos en el Recorrido.")
-        dict_prog = {row['Clave']: row for _, row in df_prog.iterrows()}
+        if prog_preparado is None:
+            prog_preparado = cls.preparar_prog(df_prog)
 
         try:
-            df_horario = pd.read_excel(io.BytesIO(horario_content))
+            # Solo columnas usadas y filas dentro del rango de fechas, leídas en bloques
+            df_horario = cls.leer_horario(horario_content, f_ini, f_fin)
             # Normalizamos 'Es Valido' pero NO filtramos el dataframe original aquí
             # para que el cálculo de 'Horas' incluya tanto registros 'SI' como 'NO'
             df_horario['Es Valido_Norm'] = df_horario['Es Valido'].astype(str).str.upper().str.strip()
-            
-            df_horario['Fecha Checkin'] = pd.to_datetime(df_horario['Fecha Checkin'], dayfirst=True, errors='coerce')
-            df_horario['Fecha Checkout'] = pd.to_datetime(df_horario['Fecha Checkout'], dayfirst=True, errors='coerce')
-            df_horario = df_horario[(df_horario['Fecha Checkin'] >= f_ini) & (df_horario['Fecha Checkin'] <= f_fin)]
         except Exception as e:
             raise ValueError(f"Error procesando archivo Horario: {e}")
 
         LIMITE_TIEMPO_PDV = timedelta(hours=0, minutes=59, seconds=59)
         # Aseguramos que 'Tiempo en PDV' sea tratado como string para la conversión a timedelta
         df_horario['Tiempo_Delta'] = pd.to_timedelta(df_horario['Tiempo en PDV'].astype(str), errors='coerce')
-        df_horario['Tiempo_PDV_Final'] = df_horario['Tiempo_Delta'].apply(
-            lambda x: LIMITE_TIEMPO_PDV if pd.notna(x) and x > LIMITE_TIEMPO_PDV else x
-        )
-        df_horario['Tiempo_PDV_String'] = df_horario['Tiempo_PDV_Final'].apply(
-            lambda x: f"{int(x.total_seconds() // 3600):02}:{int((x.total_seconds() % 3600) // 60):02}:{int(x.total_seconds() % 60):02}" if pd.notna(x) else "00:00:00"
-        )
-
-        resultados = []
-        dias_esp = {0: 'Lunes', 1: 'Martes', 2: 'Miercoles', 3: 'Jueves', 4: 'Viernes', 5: 'Sabado', 6: 'Domingo'}
-        def normalizar_dia(d): return d.replace('é','e').replace('á','a').replace('í','i').capitalize()
+        df_horario['Tiempo_PDV_Final'] = df_horario['Tiempo_Delta'].clip(upper=LIMITE_TIEMPO_PDV)
+        df_horario['Tiempo_PDV_String'] = cls.format_seconds(df_horario['Tiempo_PDV_Final'].dt.total_seconds())
 
         # 1. Preparar datos base
         df_horario = df_horario.copy()
-        df_horario['Solo_Fecha'] = df_horario['Fecha Checkin'].dt.date
+        df_horario['Solo_Fecha'] = df_horario['Fecha Checkin'].dt.normalize()
         df_horario['weekday'] = df_horario['Fecha Checkin'].dt.weekday
-        
-        # Mapa de vendedor -> linea desde la programación
-        vendedor_linea_map = df_prog.set_index('Vendedor')['Linea_Origen'].to_dict()
 
         # Extraer Cliente y Vendedor de la columna 'Codigo' (formato cliente.vendedor)
-        def extraer_ids(row):
-            # Prioridad 1: Columna 'Vendedor'
-            v_val = row.get('Vendedor')
-            v_final = None
-            if pd.notna(v_val) and str(v_val).strip() != '' and str(v_val).lower() != 'nan':
-                v_final = cls.limpiar_id(v_val)
-            
-            # Prioridad 2: Columna 'Codigo' (formato cliente.vendedor)
-            cod_val = row.get('Codigo')
-            c_final = None
-            if pd.notna(cod_val):
-                parts = str(cod_val).split('.')
-                c_final = cls.limpiar_id(parts[0])
-                if not v_final and len(parts) > 1:
-                    v_final = cls.limpiar_id(parts[1])
-            
-            return pd.Series([c_final, v_final], index=['Cliente_Clean', 'Vendedor_Final'])
-
-        df_horario[['Cliente_Clean', 'Vendedor_Final']] = df_horario.apply(extraer_ids, axis=1)
+        df_horario[['Cliente_Clean', 'Vendedor_Final']] = cls.extraer_ids(df_horario)
         
         # FILTRO: Solo procesar registros con "Es Valido" == "SI" para el cálculo de HORAS
         df_horario = df_horario[df_horario['Es Valido_Norm'] == 'SI']
@@ -133,118 +218,147 @@ class ValidatorService:
         df_horario = df_horario.dropna(subset=['Vendedor_Final'])
 
         # 2. Cálculo de Horas - Generar RESUMEN y DETALLE
-        resumen_data = []
-        detalle_data = []
-        
-        for vendedor, group in df_horario.groupby('Vendedor_Final'):
-            # Estadísticas diarias: Primer Checkin y Último Checkout del día
-            daily_stats = group.groupby('Solo_Fecha').agg({
-                'Fecha Checkin': 'min',
-                'Fecha Checkout': 'max',
-                'Cliente_Clean': 'first'  # Tomamos el primer cliente del día
-            })
-            
-            # Cálculo de Jornada Diaria: Diferencia entre la última salida y la primera entrada
-            daily_stats['Jornada_Laboral'] = daily_stats['Fecha Checkout'] - daily_stats['Fecha Checkin']
-            
-            # GENERAR DETALLE DIARIO
-            for fecha, row in daily_stats.iterrows():
-                if pd.notna(row['Jornada_Laboral']) and row['Jornada_Laboral'].total_seconds() > 0:
-                    detalle_data.append({
-                        'vendedor': vendedor,
-                        'cliente': row['Cliente_Clean'] if pd.notna(row['Cliente_Clean']) else '',
-                        'fecha': fecha.strftime('%Y-%m-%d') if hasattr(fecha, 'strftime') else str(fecha),
-                        'primer_checkin': row['Fecha Checkin'].strftime('%Y-%m-%d %H:%M:%S'),
-                        'ultimo_checkout': row['Fecha Checkout'].strftime('%Y-%m-%d %H:%M:%S') if pd.notna(row['Fecha Checkout']) else '',
-                        'total_horas_dia': cls.format_total_time(row['Jornada_Laboral'])
-                    })
-            
-            # Solo sumamos jornadas válidas y positivas para el RESUMEN
-            positive_days = daily_stats[
-                daily_stats['Jornada_Laboral'].notna() & 
-                (daily_stats['Jornada_Laboral'].dt.total_seconds() > 0)
-            ]['Jornada_Laboral']
-            
-            horas_totales_td = positive_days.sum()
-            cant_dias = len(daily_stats) # Contamos todos los días con actividad
-            prom_horas_td = horas_totales_td / cant_dias if cant_dias > 0 else timedelta(0)
-            
-            # Función auxiliar para convertir hora a segundos desde medianoche
-            def to_sec(ts): return ts.hour * 3600 + ts.minute * 60 + ts.second
-            
-            # Promedios de horarios (IGNORANDO días donde falte el dato para no desvirtuar la media)
-            avg_checkin_seg = daily_stats['Fecha Checkin'].dropna().apply(to_sec).mean()
-            avg_checkout_seg = daily_stats['Fecha Checkout'].dropna().apply(to_sec).mean()
-            
-            # Si no hay datos válidos, ponemos 0
-            avg_checkin_seg = avg_checkin_seg if pd.notna(avg_checkin_seg) else 0
-            avg_checkout_seg = avg_checkout_seg if pd.notna(avg_checkout_seg) else 0
-            
-            # Lógica de Viático basada en promedios de extremos
-            aplica_viatico = avg_checkin_seg < (9 * 3600) and avg_checkout_seg > (13 * 3600)
-            
-            def fmt_s(s):
-                s = int(s)
-                return f"{s//3600:02}:{(s%3600)//60:02}:{s%60:02}"
-
-            resumen_data.append({
-                'Vendedor': vendedor,
-                'Horas_Totales': cls.format_total_time(horas_totales_td),
-                'Dias_Trabajados': cant_dias,
-                'Promedio_Horas': cls.format_total_time(prom_horas_td),
-                'Promedio_Checkin': fmt_s(avg_checkin_seg),
-                'Promedio_Checkout': fmt_s(avg_checkout_seg),
-                'Aplica_Viatico': aplica_viatico,
-                'Linea': vendedor_linea_map.get(vendedor, 'Sin Línea')
-            })
-        
-        df_sheet_horas = pd.DataFrame(resumen_data)
-        df_detalle_horas = pd.DataFrame(detalle_data)
+        df_sheet_horas, df_detalle_horas = cls.calcular_horas(df_horario, prog_preparado['vendedor_linea_map'])
 
         # 3. Lógica de coincidencia con programación (Frecuencia)
-        df_validos = df_horario[df_horario['Es Valido_Norm'] == 'SI'].copy()
-        monday_of_start = f_ini.date() - timedelta(days=f_ini.weekday())
-        
-        def calc_semana(fecha):
-            monday_of_visita = fecha.date() - timedelta(days=fecha.weekday())
-            weeks_diff = (monday_of_visita - monday_of_start).days // 7
-            if semana_inicio == 1:
-                return 1 if weeks_diff % 2 == 0 else 2
-            return 2 if weeks_diff % 2 == 0 else 1
-
-        df_validos['Semana_Calc'] = df_validos['Fecha Checkin'].apply(calc_semana)
-        df_validos['Dia_Norm'] = df_validos['weekday'].map(dias_esp).apply(normalizar_dia)
-        
-        df_validos['Clave_Busqueda'] = (
-            df_validos['Cliente_Clean'].astype(str) + "_" + 
-            df_validos['Vendedor_Final'].astype(str) + "_" + 
-            df_validos['Dia_Norm'] + "_" + 
-            df_validos['Semana_Calc'].astype(str)
+        df_validos = df_horario[df_horario['Es Valido_Norm'] == 'SI']
+        monday_of_start = pd.Timestamp(f_ini.date() - timedelta(days=f_ini.weekday()))
+
+        # Paridad de semana respecto del lunes de inicio, sin .apply por visita
+        monday_of_visita = df_validos['Fecha Checkin'].dt.normalize() - pd.to_timedelta(df_validos['weekday'], unit='D')
+        semana_par = ((monday_of_visita - monday_of_start).dt.days // 7) % 2 == 0
+        if semana_inicio == 1:
+            semana_calc = semana_par.map({True: 1, False: 2})
+        else:
+            semana_calc = semana_par.map({True: 2, False: 1})
+
+        # Claves enteras (cliente, vendedor, día, semana), codificadas igual que en preparar_prog
+        clave_visita = cls.codificar_clave(
+            df_validos['Cliente_Clean'], df_validos['Vendedor_Final'], df_validos['weekday'], semana_calc,
+            prog_preparado['clientes'], prog_preparado['vendedores']
         )
 
-        df_res_merged = df_validos.merge(df_prog, left_on='Clave_Busqueda', right_on='Clave', how='inner')
-
-        resultados_final = []
-        for _, row in df_res_merged.iterrows():
-            resultados_final.append({
-                'Vendedor': row['Vendedor_Final'],
-                'Cliente': row['Cliente_Clean'],
-                'Fecha_Checkin': row['Fecha Checkin'],
-                'Fecha_Checkout': row['Fecha Checkout'],
-                'Tiempo_PDV_Original': row.get('Tiempo en PDV'),
-                'Tiempo_PDV_Limitado': row['Tiempo_PDV_String'],
-                'Dia_Real': dias_esp[row['weekday']],
-                'Semana_Real': row['Semana_Calc'],
-                'Programacion': row['Texto_Original'],
-                'Bloque': row['Bloque'],
-                'Linea': row['Linea_Origen'],
-                'Estado': 'COINCIDE'
-            })
-            
-        df_res = pd.DataFrame(resultados_final)
-        
+        df_visitas = pd.DataFrame({
+            'Vendedor': df_validos['Vendedor_Final'],
+            'Cliente': df_validos['Cliente_Clean'],
+            'Fecha_Checkin': df_validos['Fecha Checkin'],
+            'Fecha_Checkout': df_validos['Fecha Checkout'],
+            'Tiempo_PDV_Original': df_validos['Tiempo en PDV'] if 'Tiempo en PDV' in df_validos.columns else None,
+            'Tiempo_PDV_Limitado': df_validos['Tiempo_PDV_String'],
+            'Dia_Real': df_validos['weekday'].map(cls.DIAS_ESP),
+            'Semana_Real': semana_calc,
+            'Clave_Id': clave_visita
+        })
+        df_res = df_visitas[df_visitas['Clave_Id'] >= 0].merge(
+            prog_preparado['df_prog_claves'], on='Clave_Id', how='inner'
+        ).drop(columns='Clave_Id')
+        df_res['Estado'] = 'COINCIDE'
+
         return df_res, df_sheet_horas, df_detalle_horas, df_prog
 
+    @classmethod
+    def preparar_prog(cls, df_prog):
+        """Deriva de df_prog lo que necesita el matching: mapa vendedor -> línea y claves enteras."""
+        # Claves enteras (cliente, vendedor, día, semana) en ambos lados en lugar de concatenar strings
+        clientes = pd.unique(df_prog['Cliente'].dropna().astype(str))
+        vendedores = pd.unique(df_prog['Vendedor'].dropna().astype(str))
+        dias_idx = {nombre: idx for idx, nombre in cls.DIAS_ESP.items()}
+        clave_prog = cls.codificar_clave(
+            df_prog['Cliente'], df_prog['Vendedor'], df_prog['Dia_Prog'].map(dias_idx), df_prog['Semana_Prog'],
+            clientes, vendedores
+        )
+        df_prog_claves = pd.DataFrame({
+            'Programacion': df_prog['Texto_Original'],
+            'Bloque': df_prog['Bloque'],
+            'Linea': df_prog['Linea_Origen'],
+            'Clave_Id': clave_prog
+        })
+        return {
+            # Mapa de vendedor -> linea desde la programación
+            'vendedor_linea_map': df_prog.set_index('Vendedor')['Linea_Origen'].to_dict(),
+            'clientes': clientes,
+            'vendedores': vendedores,
+            'df_prog_claves': df_prog_claves[df_prog_claves['Clave_Id'] >= 0]
+        }
+
+    @classmethod
+    def calcular_horas(cls, df_horario, vendedor_linea_map):
+        """Genera RESUMEN y DETALLE de horas con una única agregación por (vendedor, día)."""
+        # Estadísticas diarias: Primer Checkin y Último Checkout del día
+        daily = df_horario.groupby(['Vendedor_Final', 'Solo_Fecha'], sort=True).agg(
+            Primer_Checkin=('Fecha Checkin', 'min'),
+            Ultimo_Checkout=('Fecha Checkout', 'max'),
+            Cliente=('Cliente_Clean', 'first')  # Tomamos el primer cliente del día
+        ).reset_index()
+
+        # Cálculo de Jornada Diaria: Diferencia entre la última salida y la primera entrada
+        jornada = daily['Ultimo_Checkout'] - daily['Primer_Checkin']
+        positivo = jornada.notna() & (jornada > pd.Timedelta(0))
+
+        # DETALLE DIARIO: solo jornadas válidas y positivas
+        dias_ok = daily[positivo]
+        df_detalle = pd.DataFrame({
+            'vendedor': dias_ok['Vendedor_Final'],
+            'cliente': dias_ok['Cliente'].where(dias_ok['Cliente'].notna(), ''),
+            'fecha': dias_ok['Solo_Fecha'].dt.strftime('%Y-%m-%d'),
+            'primer_checkin': dias_ok['Primer_Checkin'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+            'ultimo_checkout': dias_ok['Ultimo_Checkout'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+            'total_horas_dia': cls.format_seconds(jornada[positivo].dt.total_seconds())
+        }).reset_index(drop=True)
+
+        # RESUMEN: sumamos jornadas positivas pero contamos todos los días con actividad
+        vendedor = daily['Vendedor_Final']
+        horas_totales = jornada.where(positivo).groupby(vendedor).sum()
+        cant_dias = vendedor.value_counts(sort=False).reindex(horas_totales.index)
+        prom_horas = horas_totales / cant_dias
+
+        # Promedios de horarios en segundos desde medianoche (NaT se ignora en la media)
+        def to_sec(ts): return ts.dt.hour * 3600 + ts.dt.minute * 60 + ts.dt.second
+        avg_checkin_seg = to_sec(daily['Primer_Checkin']).groupby(vendedor).mean().fillna(0)
+        avg_checkout_seg = to_sec(daily['Ultimo_Checkout']).groupby(vendedor).mean().fillna(0)
+
+        # Lógica de Viático basada en promedios de extremos
+        aplica_viatico = (avg_checkin_seg < (9 * 3600)) & (avg_checkout_seg > (13 * 3600))
+
+        vendedores = horas_totales.index.to_series()
+        lineas = vendedores.map(vendedor_linea_map).where(vendedores.isin(vendedor_linea_map.keys()), 'Sin Línea')
+
+        df_resumen = pd.DataFrame({
+            'Vendedor': vendedores,
+            'Horas_Totales': cls.format_seconds(horas_totales.dt.total_seconds()),
+            'Dias_Trabajados': cant_dias,
+            'Promedio_Horas': cls.format_seconds(prom_horas.dt.total_seconds()),
+            'Promedio_Checkin': cls.format_seconds(avg_checkin_seg),
+            'Promedio_Checkout': cls.format_seconds(avg_checkout_seg),
+            'Aplica_Viatico': aplica_viatico,
+            'Linea': lineas
+        }).reset_index(drop=True)
+        return df_resumen, df_detalle
+
+    @staticmethod
+    def codificar_clave(cliente, vendedor, weekday, semana, clientes, vendedores):
+        """Codifica (cliente, vendedor, día, semana) como un int64 compacto; -1 si no puede coincidir."""
+        # get_indexer devuelve -1 para valores fuera de la programación (clientes/vendedores son únicos)
+        cliente_code = pd.Index(clientes).get_indexer(cliente.astype(str)).astype('int64')
+        vendedor_code = pd.Index(vendedores).get_indexer(vendedor.astype(str)).astype('int64')
+        weekday = pd.to_numeric(weekday, errors='coerce').to_numpy(dtype='float64')
+        semana = pd.to_numeric(semana, errors='coerce').to_numpy(dtype='float64')
+
+        valido = (cliente_code >= 0) & (vendedor_code >= 0) & ~np.isnan(weekday) & np.isin(semana, (1, 2))
+        clave = ((cliente_code * len(vendedores) + vendedor_code) * 7 + np.nan_to_num(weekday).astype('int64')) * 2
+        clave += np.nan_to_num(semana).astype('int64') - 1
+        return pd.Series(np.where(valido, clave, -1), index=cliente.index)
+
+    @staticmethod
+    def format_seconds(segundos):
+        """Versión vectorizada de format_total_time sobre una Series de segundos (NaN -> 00:00:00)."""
+        segundos = np.floor(segundos.fillna(0)).astype('int64')
+        return (
+            (segundos // 3600).astype(str).str.zfill(2) + ':' +
+            ((segundos % 3600) // 60).astype(str).str.zfill(2) + ':' +
+            (segundos % 60).astype(str).str.zfill(2)
+        )
+
     @staticmethod
     def format_total_time(td):
         if pd.isna(td): return "00:00:00"
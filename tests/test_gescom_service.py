@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from src.repositories.gescom_repository import GescomRepository
+from src.services.gescom_service import GescomService
+
+
+def test_normalize_chunk_alias_distinto_por_registro():
+    registros = [
+        {'cliente': 'A1', 'vendedor': '7', 'fecha': '2026-03-01'},
+        {'cod_cliente': 5, 'Cod Vendedor': '8.0', 'fecha_venta': '2026-03-02'},
+    ]
+    df, motivos, rechazos = GescomService.normalize_chunk(registros, 0)
+    assert not motivos and not rechazos
+    assert df['cliente'].tolist() == ['A1', '5']
+    assert df['vendedor'].tolist() == ['7', '8']
+    assert df['fecha'].tolist() == [pd.Timestamp('2026-03-01'), pd.Timestamp('2026-03-02')]
+
+
+def test_normalize_chunk_no_depende_de_los_vecinos():
+    registro = {'cod_cliente': 5, 'fecha_venta': 'nope'}
+    solo = GescomService.normalize_chunk([registro], 0)
+    acompañado = GescomService.normalize_chunk([{'cliente': 'A1', 'fecha': '2026-03-01'}, registro], 0)
+    assert solo[1] == {'Fecha inválida': 1}
+    assert acompañado[1] == {'Fecha inválida': 1}
+    assert acompañado[2] == [{'linea': 1, 'motivo': 'Fecha inválida'}]
+
+
+def test_normalize_chunk_rechazos():
+    registros = ['x', {'importe': 1}, {'cliente': None, 'id_cliente': 3}]
+    df, motivos, rechazos = GescomService.normalize_chunk(registros, 10)
+    assert motivos == {'El registro no es un objeto': 1, 'Sin vendedor ni cliente': 1}
+    assert [r['linea'] for r in rechazos] == [10, 11]
+    assert df['linea'].tolist() == [12] and df['cliente'].tolist() == ['3']
+
+
+def test_parse_fechas_iso_y_dia_primero():
+    iso, _ = GescomService.parse_fechas(pd.Series(['2026-03-01', '2026-03-02T10:00:00-03:00']))
+    assert iso.tolist() == [pd.Timestamp('2026-03-01'), pd.Timestamp('2026-03-02 13:00')]
+    dia_primero, _ = GescomService.parse_fechas(pd.Series(['04/03/2026', None, '']))
+    assert dia_primero.iloc[0] == pd.Timestamp('2026-03-04') and dia_primero.iloc[1:].isna().all()
+
+
+def test_ingest_no_modifica_la_lista_recibida(monkeypatch):
+    monkeypatch.setattr(GescomService, 'CHUNK_ROWS', 1)
+    monkeypatch.setattr(GescomRepository, 'create_lote', staticmethod(lambda total: (1, 'L1')))
+    monkeypatch.setattr(GescomRepository, 'save_chunk', staticmethod(lambda db, pk, df, rechazados: None))
+    monkeypatch.setattr(GescomRepository, 'finish_lote', staticmethod(lambda pk: None))
+    registros = [{'cliente': 'A1'}, {'cliente': 'A2'}, 'x']
+    copia = list(registros)
+    resultado = GescomService.ingest(registros)
+    assert registros == copia
+    assert resultado['insertados'] == 2 and resultado['rechazados'] == 1 and resultado['chunks'] == 3
+
+
+def test_ingest_conserva_el_error_original_si_falla_el_descarte(monkeypatch):
+    def save_chunk(db, pk, df, rechazados):
+        raise ValueError('chunk roto')
+
+    def discard_lote(pk, error):
+        raise RuntimeError('sin conexión')
+
+    monkeypatch.setattr(GescomRepository, 'create_lote', staticmethod(lambda total: (1, 'L1')))
+    monkeypatch.setattr(GescomRepository, 'save_chunk', staticmethod(save_chunk))
+    monkeypatch.setattr(GescomRepository, 'discard_lote', staticmethod(discard_lote))
+    with pytest.raises(ValueError, match='chunk roto'):
+        GescomService.ingest([{'cliente': 'A1'}])
@@ -0,0 +1,70 @@
+import os
+import time
+from concurrent.futures import Future, wait
+from src.core.job_manager import JobManager
+
+
+def esperar(manager, job_ids):
+    for job_id in job_ids:
+        job = manager.get(job_id)
+        if job:
+            job["future"].result(timeout=60)
+    time.sleep(0.1)  # mark_finished corre en el callback del future
+
+
+def esperar_fin(manager, job_id):
+    wait([manager.get(job_id)["future"]], timeout=60)
+    time.sleep(0.1)
+
+
+def test_conserva_como_mucho_max_results_terminados():
+    manager = JobManager(max_workers=1, max_jobs=4, ttl=3600, max_results=2)
+    try:
+        job_ids = []
+        for valor in range(4):
+            job_ids.append(manager.submit(sum, [valor, 1]))
+            esperar(manager, job_ids[-1:])
+        assert manager.get(job_ids[0]) is None and manager.get(job_ids[1]) is None
+        assert manager.status(job_ids[2])["status"] == "done"
+        assert manager.get(job_ids[3])["future"].result() == 4
+    finally:
+        manager.shutdown()
+
+
+def test_descarta_terminados_vencidos():
+    manager = JobManager(max_workers=1, max_jobs=4, ttl=0, max_results=8)
+    try:
+        job_id = manager.submit(sum, [1, 2])
+        esperar(manager, [job_id])
+        with manager.lock:
+            manager.purge_expired()
+        assert manager.status(job_id) is None
+    finally:
+        manager.shutdown()
+
+
+def test_reemplaza_el_pool_roto():
+    manager = JobManager(max_workers=1, max_jobs=4, ttl=3600, max_results=8)
+    try:
+        caido = manager.submit(os._exit, 1)  # Simula un worker que muere (ej. OOM)
+        esperar_fin(manager, caido)
+        assert manager.status(caido)["status"] == "error"
+
+        job_id = manager.submit(sum, [2, 3])
+        assert manager.get(job_id)["future"].result(timeout=60) == 5
+        assert manager.status(caido)["status"] == "error"
+    finally:
+        manager.shutdown()
+
+
+def test_trabajos_pendientes_del_pool_roto_quedan_en_error():
+    manager = JobManager(max_workers=1, max_jobs=4, ttl=3600, max_results=8)
+    try:
+        pendiente = manager.submit(sum, [1])
+        manager.jobs[pendiente]["future"] = Future()  # Nunca termina: como un trabajo encolado en el pool roto
+        with manager.lock:
+            manager.reset_executor()
+        status = manager.status(pendiente)
+        assert status["status"] == "error" and "inesperadamente" in status["error"]
+    finally:
+        manager.shutdown()
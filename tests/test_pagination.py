@@ -0,0 +1,51 @@
+import base64
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.api.route_validator import router
+from src.core.pagination import KeysetCursor, InvalidCursorError
+from src.repositories.frecuencia_repository import FrecuenciaRepository
+
+
+def cursor_de(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+ADULTERADOS = [
+    cursor_de(["2026-03-01T10:00:00", "x"]),
+    cursor_de(["2026-03-01T10:00:00", True]),
+    cursor_de(["2026-03-01T10:00:00", 1.5]),
+    cursor_de(["no-es-fecha", 3]),
+    cursor_de([20260301, 3]),
+    cursor_de({"f": "2026-03-01T10:00:00", "id": 3}),
+    "%%%",
+]
+
+
+def test_cursor_ida_y_vuelta():
+    from datetime import datetime
+    fecha = datetime(2026, 3, 1, 10, 30)
+    c_fecha, c_id = KeysetCursor.decode(KeysetCursor.encode(fecha, 42), 2)
+    assert (KeysetCursor.decode_datetime(c_fecha), KeysetCursor.decode_id(c_id)) == (fecha, 42)
+
+
+@pytest.mark.parametrize("cursor", ADULTERADOS)
+def test_get_history_rechaza_cursor_adulterado(cursor):
+    with pytest.raises(InvalidCursorError):
+        FrecuenciaRepository.get_history(limit=10, cursor=cursor)
+
+
+@pytest.mark.parametrize("cursor", ADULTERADOS)
+def test_get_recent_frecuencia_rechaza_cursor_adulterado(cursor):
+    with pytest.raises(InvalidCursorError):
+        FrecuenciaRepository.get_recent_frecuencia(limit=10, cursor=cursor)
+
+
+@pytest.mark.parametrize("cursor", ADULTERADOS)
+def test_history_responde_400_con_cursor_adulterado(cursor):
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).get("/route-validator/history", params={"limit": 10, "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor inválido."
@@ -0,0 +1,176 @@
+"""Planes de las consultas de FrecuenciaRepository: cada lectura por batch o por fecha debe usar su índice.
+
+Se capturan las sentencias que SQLAlchemy compila y envía al llamar a cada método, y se corre EXPLAIN
+sobre ellas con los mismos parámetros. Requiere Postgres en TEST_DATABASE_URL (se usa un schema temporal);
+sin él los tests se saltean.
+"""
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event, text
+from src.models.route_models import (
+    Base, SessionLocal, engine as app_engine, AxumGpsModel, FrecuenciaModel, FrecuenciaHeaderModel, HorasHeaderModel, HorasDetalleModel
+)
+from src.repositories.frecuencia_repository import FrecuenciaRepository
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TABLAS_POR_BATCH = {"frecuencia", "frecuencia_header", "horas_header", "horas"}
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL or not TEST_DATABASE_URL.startswith("postgresql"),
+    reason="Requiere Postgres en TEST_DATABASE_URL"
+)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    schema = f"test_plans_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_DATABASE_URL)
+    try:
+        with admin.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+    except Exception as e:
+        pytest.skip(f"Postgres no disponible: {e}")
+    engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={schema}"})
+    Base.metadata.create_all(engine)
+    cargar_batches(engine)
+    SessionLocal.configure(bind=engine)
+    yield engine
+    SessionLocal.configure(bind=app_engine)
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+
+def cargar_batches(engine):
+    """Dos batches: B1 con conteos precalculados y LEGACY sin ellos (consulta de agregados)."""
+    db = SessionLocal(bind=engine)
+    inicio = datetime(2026, 3, 2, 8)
+    for batch_id, conteos in (("B1", 3), ("LEGACY", None)):
+        gps = AxumGpsModel(batch_id=batch_id, fecha_desde=inicio, fecha_hasta=inicio + timedelta(days=30),
+                           total_visitas=conteos, total_vendedores=conteos)
+        db.add(gps)
+        db.flush()
+        for v in range(3):
+            db.add(FrecuenciaHeaderModel(axum_gps_id=gps.id, vendedor=str(v), total_clientes=conteos,
+                                         total_visitas=conteos))
+            db.add(HorasHeaderModel(axum_gps_id=gps.id, vendedor=str(v), horas_totales="08:00:00"))
+            for c in range(3):
+                checkin = inicio + timedelta(days=c, hours=v)
+                db.add(FrecuenciaModel(axum_gps_id=gps.id, batch_id=batch_id, vendedor=str(v), cliente=str(c),
+                                       fecha_checkin=checkin, fecha_checkout=checkin + timedelta(minutes=20)))
+                db.add(HorasDetalleModel(axum_gps_id=gps.id, vendedor=str(v), cliente=str(c), fecha=checkin))
+    db.commit()
+    db.close()
+    with engine.connect() as conn:
+        for tabla in sorted(TABLAS_POR_BATCH):
+            conn.execute(text(f"ANALYZE {tabla}"))
+        conn.commit()
+
+
+def sentencias(engine, llamada):
+    """Corre `llamada` y devuelve los SELECT (sentencia, parámetros) que envió a la base."""
+    capturadas = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            capturadas.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capturar)
+    try:
+        resultado = llamada()
+        if hasattr(resultado, "__next__"):
+            list(resultado)
+    finally:
+        event.remove(engine, "before_cursor_execute", capturar)
+    return capturadas
+
+
+def escaneos(nodo):
+    """(tipo de nodo, tabla, índice) de cada lectura de tabla del plan."""
+    encontrados = []
+    if "Relation Name" in nodo:
+        encontrados.append((nodo["Node Type"], nodo["Relation Name"], nodo.get("Index Name")))
+    for hijo in nodo.get("Plans", []):
+        encontrados += escaneos(hijo)
+    return encontrados
+
+
+def planes(engine, capturadas):
+    resultado = []
+    with engine.connect() as conn:
+        # Con tablas chicas el planner prefiere seq scan: desactivado, un Seq Scan significa que no hay índice usable
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in capturadas:
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            resultado.append((statement, escaneos(plan[0]["Plan"])))
+    return resultado
+
+
+def axum_gps_id(batch_id):
+    return FrecuenciaRepository.get_axum_gps_id(batch_id)
+
+
+CASOS = {
+    "get_batch_details": (
+        lambda: FrecuenciaRepository.get_batch_details("B1"),
+        {"ix_frecuencia_axum_gps_id_vendedor", "ix_frecuencia_header_axum_gps_id", "ix_horas_header_axum_gps_id",
+         "ix_horas_axum_gps_id"},
+    ),
+    "get_batch_details_with_cliente_count": (
+        lambda: FrecuenciaRepository.get_batch_details_with_cliente_count("B1"),
+        {"ix_frecuencia_header_axum_gps_id"},
+    ),
+    "get_batch_details_with_cliente_count_legacy": (
+        lambda: FrecuenciaRepository.get_batch_details_with_cliente_count("LEGACY"),
+        {"ix_frecuencia_header_axum_gps_id", "ix_frecuencia_axum_gps_id_vendedor"},
+    ),
+    "get_batch_hours": (
+        lambda: FrecuenciaRepository.get_batch_hours("B1"),
+        {"ix_horas_header_axum_gps_id"},
+    ),
+    "get_frecuencia_summary": (
+        lambda: FrecuenciaRepository.get_frecuencia_summary(batch_id="B1"),
+        {"ix_frecuencia_header_axum_gps_id"},
+    ),
+    "get_recent_frecuencia": (
+        lambda: FrecuenciaRepository.get_recent_frecuencia(limit=2),
+        {"ix_frecuencia_fecha_checkin_id"},
+    ),
+    "get_recent_frecuencia_cursor": (
+        lambda: FrecuenciaRepository.get_recent_frecuencia(
+            limit=2, cursor=FrecuenciaRepository.get_recent_frecuencia(limit=2)["next_cursor"]
+        ),
+        {"ix_frecuencia_fecha_checkin_id"},
+    ),
+    **{
+        f"iter_batch_table_{tabla}": (
+            lambda tabla=tabla: FrecuenciaRepository.iter_batch_table(axum_gps_id("B1"), tabla),
+            {indice},
+        )
+        for tabla, indice in (("visitas", "ix_frecuencia_axum_gps_id_vendedor"),
+                              ("horas_resumen", "ix_horas_header_axum_gps_id"),
+                              ("horas_detalle", "ix_horas_axum_gps_id"))
+    },
+}
+
+
+@pytest.mark.parametrize("caso", list(CASOS))
+def test_consultas_del_repositorio_usan_indices(engine, caso):
+    llamada, esperados = CASOS[caso]
+    capturadas = sentencias(engine, llamada)
+    assert capturadas, "el método no envió consultas"
+
+    usados = set()
+    for statement, lecturas in planes(engine, capturadas):
+        for tipo, tabla, indice in lecturas:
+            if tabla in TABLAS_POR_BATCH:
+                assert tipo != "Seq Scan", f"Seq Scan sobre {tabla} en:\n{statement}"
+            if indice:
+                usados.add(indice)
+    assert esperados <= usados, f"faltan índices en el plan: {sorted(esperados - usados)}"
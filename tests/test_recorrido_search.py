@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from src.models.route_models import Base, SessionLocal, engine as app_engine, RecorridoModel
+from src.repositories.recorrido_repository import RecorridoRepository
+from src.core.recorrido_index import RecorridoSearchIndex
+
+FILAS = [
+    ("20_5", "100%", "Linea_A", "B1", "Lunes"),
+    ("2035", "1000", "LineaXA", "B1", "lunes"),
+    ("a%b", "a_b", "linea a", "B2", "Martes"),
+    ("axb", "AXB", "Linea%A", "B%", "Lu_es"),
+    ("A%B", None, None, "b2", "Martes"),
+]
+
+
+@pytest.fixture(scope="module")
+def recorridos():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    SessionLocal.configure(bind=engine)
+    db = SessionLocal()
+    for vendedor, cliente, linea, bloque, dia in FILAS:
+        db.add(RecorridoModel(vendedor=vendedor, cliente=cliente, linea_origen=linea, bloque=bloque,
+                              dia_prog=dia, semana_prog=1))
+    db.commit()
+    db.close()
+    yield RecorridoSearchIndex(RecorridoRepository.get_all_rows())
+    SessionLocal.configure(bind=app_engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("filtros, esperados", [
+    ({"vendedor": "20_"}, ["20_5"]),          # '_' literal: no coincide con 2035
+    ({"vendedor": "a%b"}, ["a%b", "A%B"]),    # '%' literal y sin distinguir mayúsculas
+    ({"vendedor": "%"}, ["a%b", "A%B"]),
+    ({"cliente": "0%"}, ["20_5"]),
+    ({"cliente": "_"}, ["a%b"]),
+    ({"linea": "a_a"}, ["20_5"]),
+    ({"bloque": "b%"}, ["axb"]),
+    ({"dia": "lu_es"}, ["axb"]),              # día: valor completo, sin comodines
+    ({"dia": "LUNES"}, ["20_5", "2035"]),
+])
+def test_filtros_de_texto_son_literales_en_ambos_caminos(recorridos, filtros, esperados):
+    sql, total_sql, _ = RecorridoRepository.get_filtered(limit=100, **filtros)
+    indice, total_indice, _ = recorridos.search(limit=100, **filtros)
+    assert sorted(r.vendedor for r in sql) == sorted(esperados)
+    assert [r['id'] for r in indice] == [r.id for r in sql]
+    assert total_sql == total_indice == len(esperados)
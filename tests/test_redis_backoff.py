@@ -0,0 +1,28 @@
+import redis
+from src.core import redis_client
+from src.core.redis_client import RedisMicroservice
+
+
+class PubSubCaido:
+    def subscribe(self, *channels):
+        raise redis.ConnectionError("Connection refused")
+
+    def close(self):
+        pass
+
+
+def test_listen_reintenta_con_backoff_exponencial(monkeypatch):
+    ms = RedisMicroservice(host="localhost", queue="TEST")
+    ms.reconnect_min, ms.reconnect_max = 0.5, 4
+    monkeypatch.setattr(ms.redis_client, "pubsub", PubSubCaido)
+    monkeypatch.setattr(redis_client.random, "uniform", lambda a, b: 1.0)
+    esperas = []
+
+    def sleep(segundos):
+        esperas.append(segundos)
+        if len(esperas) == 6:
+            ms.is_running = False
+
+    monkeypatch.setattr(redis_client.time, "sleep", sleep)
+    ms.listen()
+    assert esperas == [0.5, 1, 2, 4, 4, 4]
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+import pytest
+import redis.asyncio as aioredis
+from src.core.redis_client import RedisStreamsMicroservice
+
+REDIS_TEST_URL = os.getenv("REDIS_TEST_URL", "redis://localhost:6379/15")
+
+
+def redis_disponible():
+    async def ping():
+        client = aioredis.Redis.from_url(REDIS_TEST_URL, socket_connect_timeout=0.5, retry=None)
+        try:
+            return await client.ping()
+        except Exception:
+            return False
+        finally:
+            await client.aclose()
+    return asyncio.run(ping())
+
+
+@pytest.fixture(scope="module")
+def redis_factory():
+    """Clientes contra el redis-server local (REDIS_TEST_URL) o, si no hay servidor, fakeredis."""
+    if redis_disponible():
+        return lambda: aioredis.Redis.from_url(REDIS_TEST_URL, decode_responses=True)
+    fakeredis = pytest.importorskip("fakeredis", reason="Sin redis-server local ni fakeredis")
+    server = fakeredis.FakeServer()
+    return lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+
+def crear_consumidor(redis_factory, queue, nombre, handler, max_deliveries=5):
+    ms = RedisStreamsMicroservice(queue=queue, consumer=nombre, workers=2)
+    ms.redis_client = redis_factory()
+    ms.block_ms, ms.claim_idle_ms, ms.claim_interval, ms.max_deliveries = 50, 100, 0.05, max_deliveries
+    ms.on("tarea")(handler)
+    return ms
+
+
+async def publicar(client, queue, data, packet_id=None):
+    packet = {"pattern": "tarea", "data": data, "id": packet_id}
+    await client.xadd(f"{queue}:stream", {"packet": json.dumps(packet)})
+
+
+async def esperar(condicion, timeout=10):
+    limite = asyncio.get_running_loop().time() + timeout
+    while not await condicion():
+        assert asyncio.get_running_loop().time() < limite, "timeout esperando la condición"
+        await asyncio.sleep(0.05)
+
+
+async def limpiar(client, queue):
+    await client.delete(f"{queue}:stream", f"{queue}:dead")
+    await client.aclose()
+
+
+def test_cada_mensaje_se_procesa_una_vez_entre_dos_consumidores(redis_factory):
+    async def run():
+        queue, client = f"TEST_{uuid.uuid4().hex}", redis_factory()
+        procesados = []
+        consumidores = [
+            crear_consumidor(redis_factory, queue, nombre, lambda d, nombre=nombre: procesados.append((nombre, d)))
+            for nombre in ("a", "b")
+        ]
+        for ms in consumidores:
+            await ms.start()
+        await esperar(lambda: consumidores[0].redis_client.exists(f"{queue}:stream"))
+        for valor in range(40):
+            await publicar(client, queue, valor)
+        try:
+            async def vacio():
+                pendientes = await client.xpending(f"{queue}:stream", "sales-service")
+                return len(procesados) >= 40 and pendientes["pending"] == 0
+            await esperar(vacio)
+        finally:
+            for ms in consumidores:
+                await ms.stop()
+        # Cada valor una sola vez, sin importar qué consumidor lo tomó
+        assert sorted(d for _, d in procesados) == list(range(40))
+        # Lo confirmado se borra del stream
+        assert await client.xlen(f"{queue}:stream") == 0
+        await limpiar(client, queue)
+    asyncio.run(run())
+
+
+def test_reclama_entrada_de_un_consumidor_caido(redis_factory):
+    async def run():
+        queue, client = f"TEST_{uuid.uuid4().hex}", redis_factory()
+        procesados = []
+        ms = crear_consumidor(redis_factory, queue, "b", procesados.append)
+        await ms.redis_client.xgroup_create(f"{queue}:stream", ms.group, id="0", mkstream=True)
+        await publicar(client, queue, "huerfano", packet_id="p1")
+        # "a" lee la entrada y se cae sin XACK: queda pendiente a su nombre
+        leidas = await client.xreadgroup(ms.group, "a", {f"{queue}:stream": ">"}, count=1)
+        assert len(leidas[0][1]) == 1
+        respuestas = client.pubsub()
+        await respuestas.subscribe(f"{queue}.res")
+        await ms.start()
+        try:
+            async def reclamada():
+                pendientes = await client.xpending(f"{queue}:stream", ms.group)
+                return procesados == ["huerfano"] and pendientes["pending"] == 0
+            await esperar(reclamada)
+            mensaje = None
+            while mensaje is None:
+                mensaje = await respuestas.get_message(ignore_subscribe_messages=True, timeout=1)
+            assert json.loads(mensaje["data"]) == {"id": "p1", "isDisposed": True, "response": None}
+        finally:
+            await ms.stop()
+            await respuestas.aclose()
+        await limpiar(client, queue)
+    asyncio.run(run())
+
+
+def test_dead_letter_al_superar_max_deliveries(redis_factory):
+    async def run():
+        queue, client = f"TEST_{uuid.uuid4().hex}", redis_factory()
+        intentos = []
+
+        def falla(data):
+            intentos.append(data)
+            raise RuntimeError("siempre falla")
+
+        ms = crear_consumidor(redis_factory, queue, "a", falla, max_deliveries=2)
+        await ms.redis_client.xgroup_create(f"{queue}:stream", ms.group, id="0", mkstream=True)
+        await publicar(client, queue, "veneno")
+        await ms.start()
+        try:
+            await esperar(lambda: client.xlen(f"{queue}:dead"))
+        finally:
+            await ms.stop()
+        [(_, campos)] = await client.xrange(f"{queue}:dead")
+        assert json.loads(campos["packet"])["data"] == "veneno"
+        assert campos["error"] == "Superó 2 entregas"
+        assert len(intentos) == 2
+        assert (await client.xpending(f"{queue}:stream", ms.group))["pending"] == 0
+        assert await client.xlen(f"{queue}:stream") == 0
+        await limpiar(client, queue)
+    asyncio.run(run())
+
+
+def test_handler_lento_no_se_reprocesa_en_otro_consumidor(redis_factory):
+    async def run():
+        queue, client = f"TEST_{uuid.uuid4().hex}", redis_factory()
+        procesados = []
+
+        def lento(data):
+            time.sleep(0.6)  # Varias veces claim_idle_ms (100 ms)
+            procesados.append(data)
+
+        consumidores = [crear_consumidor(redis_factory, queue, nombre, lento) for nombre in ("a", "b")]
+        await consumidores[0].redis_client.xgroup_create(f"{queue}:stream", "sales-service", id="0", mkstream=True)
+        for ms in consumidores:
+            await ms.start()
+        await publicar(client, queue, "lento")
+        try:
+            async def terminado():
+                return procesados and await client.xlen(f"{queue}:stream") == 0
+            await esperar(terminado)
+            await asyncio.sleep(0.3)
+        finally:
+            for ms in consumidores:
+                await ms.stop()
+        assert procesados == ["lento"]
+        await limpiar(client, queue)
+    asyncio.run(run())
@@ -0,0 +1,46 @@
+import datetime
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from src.core.result_cache import RedisResultCache, frames_to_bytes, frames_from_bytes
+
+
+def frames():
+    visitas = pd.DataFrame({
+        'Vendedor': pd.Series(['1', '2', None], dtype=object),
+        'Fecha_Checkin': pd.to_datetime(['2026-03-01 08:00', None, '2026-03-02 09:30']),
+        'Tiempo_PDV_Original': pd.Series(['00:10:00', datetime.time(0, 5), None], dtype=object).astype(str),
+        'Semana_Real': [1, 2, 1],
+    }).set_axis([4, 7, 9])
+    resumen = pd.DataFrame({'Vendedor': ['1'], 'Aplica_Viatico': [True], 'Viatico': [np.nan]})
+    return visitas, resumen, pd.DataFrame(columns=['vendedor', 'cliente'])
+
+
+def test_frames_ida_y_vuelta():
+    originales = frames()
+    for original, leido in zip(originales, frames_from_bytes(frames_to_bytes(originales))):
+        pd.testing.assert_frame_equal(original, leido, check_index_type=False)
+
+
+@pytest.mark.parametrize("blob", [b"", b"basura", frames_to_bytes(frames())[:-10]])
+def test_frames_from_bytes_rechaza_contenido_invalido(blob):
+    with pytest.raises(ValueError):
+        frames_from_bytes(blob)
+
+
+class Explota:
+    def __reduce__(self):
+        return (os.system, ("touch /tmp/result_cache_pwned",))
+
+
+def test_redis_cache_no_deserializa_pickle():
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = RedisResultCache(fakeredis.FakeRedis())
+    cache.client.set(cache.prefix + "k", pickle.dumps(Explota()))
+    assert cache.get("k") is None
+    assert not os.path.exists("/tmp/result_cache_pwned")
+
+    cache.set("k", frames())
+    assert len(cache.get("k")) == 3
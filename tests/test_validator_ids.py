@@ -0,0 +1,86 @@
+import io
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from src.services.validator_service import ValidatorService
+
+VALORES = [np.nan, None, 12.0, 12.5, 7, '12.0', ' 12.5 ', '0012', 'abc', 'A.B.C', '.5', '5.', '', '  ', 'nan', 'NaN',
+           ' nan ', 'None']
+
+
+def extraer_ids_por_fila(row):
+    """Lógica fila a fila previa a la versión columnar de extraer_ids (referencia del test)."""
+    v_val = row.get('Vendedor')
+    v_final = None
+    if pd.notna(v_val) and str(v_val).strip() != '' and str(v_val).lower() != 'nan':
+        v_final = ValidatorService.limpiar_id(v_val)
+    cod_val = row.get('Codigo')
+    c_final = None
+    if pd.notna(cod_val):
+        parts = str(cod_val).split('.')
+        c_final = ValidatorService.limpiar_id(parts[0])
+        if not v_final and len(parts) > 1:
+            v_final = ValidatorService.limpiar_id(parts[1])
+    return c_final, v_final
+
+
+def faltante_como_none(valores):
+    """None y NaN se tratan igual aguas abajo (dropna/isna): se comparan como None."""
+    return [tuple(None if pd.isna(v) else v for v in fila) for fila in valores]
+
+
+@pytest.mark.parametrize("valor", VALORES)
+def test_limpiar_ids_igual_a_limpiar_id(valor):
+    columnar = ValidatorService.limpiar_ids(pd.Series([str(valor)], dtype=object))
+    assert columnar.iloc[0] == ValidatorService.limpiar_id(valor)
+
+
+@pytest.mark.parametrize("vendedor, codigo", [
+    (np.nan, '23453.239'),        # Sin Vendedor: se toma de Codigo
+    ('15', '23453.239'),          # Vendedor tiene prioridad
+    (15.0, 23453.239),            # Floats de Excel
+    ('', '100.7'),                # Vendedor vacío: fallback a Codigo
+    ('nan', '100.7'),
+    ('.9', '100.7'),              # Vendedor que queda vacío al limpiar también cae al fallback
+    (np.nan, '100'),              # Codigo sin punto: sin vendedor
+    (np.nan, 'CLI-A.VEN-B.X'),    # Codigo de texto
+    (np.nan, '.5'),
+    (np.nan, np.nan),
+    ('  8 ', np.nan),
+    (np.nan, ''),
+])
+def test_extraer_ids_igual_a_version_por_fila(vendedor, codigo):
+    df = pd.DataFrame({'Vendedor': pd.Series([vendedor], dtype=object), 'Codigo': pd.Series([codigo], dtype=object)})
+    ids = ValidatorService.extraer_ids(df)
+    cliente, vendedor_final = extraer_ids_por_fila(df.iloc[0])
+    obtenido = [(ids['Cliente_Clean'].iloc[0], ids['Vendedor_Final'].iloc[0])]
+    assert faltante_como_none(obtenido) == faltante_como_none([(cliente, vendedor_final)])
+
+
+@pytest.mark.parametrize("columnas", [['Vendedor', 'Codigo'], ['Codigo'], ['Vendedor']])
+def test_extraer_ids_columnas_mezcladas(columnas):
+    df = pd.DataFrame({
+        'Vendedor': pd.Series(VALORES, dtype=object),
+        'Codigo': pd.Series(['23453.239', 23453.239, '1.2.3', np.nan, '', '.', 'x.y'] + VALORES[7:], dtype=object),
+    })[columnas]
+    ids = ValidatorService.extraer_ids(df)
+    esperado = [extraer_ids_por_fila(row) for _, row in df.iterrows()]
+    obtenido = list(zip(ids['Cliente_Clean'], ids['Vendedor_Final']))
+    assert faltante_como_none(obtenido) == faltante_como_none(esperado)
+
+
+def test_leer_horario_conserva_codigo_numerico_como_texto():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Codigo', 'Fecha Checkin', 'Fecha Checkout', 'Tiempo en PDV', 'Es Valido'])
+    ws.append(['20100.270', '02/03/2026', '02/03/2026', '00:10:00', 'SI'])
+    ws.append([20100.0, '02/03/2026', '02/03/2026', '00:10:00', 'SI'])
+    ws.append(['', '02/03/2026', '02/03/2026', '00:10:00', 'SI'])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    df = ValidatorService.leer_horario(buffer.getvalue(), datetime(2026, 3, 1), datetime(2026, 3, 31))
+    assert df['Codigo'].tolist() == ['20100.270', 20100, None]
+    ids = ValidatorService.extraer_ids(df)
+    assert ids['Vendedor_Final'].iloc[0] == '270'